@@ -0,0 +1,44 @@
+from time import perf_counter
+
+from lab.util import message
+from lab.util.argument_parser import get_arg
+from lab.util.file_transfer import FileSender, NO_COMPRESSION, ZLIB, TEXT, BINARY
+from lab.util.validation import assert_positive_int
+
+
+def create_partition(number_of_edges: int) -> list:
+    # Lines like the sub graphs of the master, with 10 edges per vertex
+    return [f'{edge // 10} {(edge * 7919) % number_of_edges}\n' for edge in range(number_of_edges)]
+
+
+def measure(data: list, compression: str, edge_format: str) -> (float, int, int):
+    """
+    :return: Time to cut the partition into messages, number of messages, total size of the messages
+    """
+
+    started_at = perf_counter()
+    messages = list(iter(FileSender(
+        0, message.GRAPH, data, compression, edge_format=edge_format).read_next_message, None))
+
+    return perf_counter() - started_at, len(messages), sum(len(chunk_message) for chunk_message in messages)
+
+
+def run(number_of_edges: int):
+    print(f"{'edges':>9} {'codec':>7} {'format':>7} {'compression':>12} {'chunks':>7} {'MB':>8} {'seconds':>9} {'edges/s':>12}")
+
+    # Chunking is linear when doubling the partition doubles the time
+    for edges in [number_of_edges // 4, number_of_edges // 2, number_of_edges]:
+        data = create_partition(edges)
+
+        for name in message.CODECS.keys():
+            message.set_codec(name)
+
+            for edge_format, compression in [(TEXT, NO_COMPRESSION), (TEXT, ZLIB), (BINARY, NO_COMPRESSION),
+                                             (BINARY, ZLIB)]:
+                duration, number_of_messages, size = measure(data, compression, edge_format)
+                print(f"{edges:>9} {name:>7} {edge_format:>7} {compression:>12} {number_of_messages:>7} "
+                      f"{size / 1024 / 1024:>8.1f} {duration:>9.3f} {edges / duration:>12.0f}")
+
+
+if __name__ == '__main__':
+    run(get_arg("--edges", assert_positive_int, default='1000000'))
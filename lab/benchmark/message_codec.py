@@ -0,0 +1,96 @@
+import zlib
+from time import perf_counter
+
+import numpy as np
+
+from lab.util import message
+from lab.util.argument_parser import get_arg
+from lab.util.validation import assert_positive_int
+
+CHUNK = ''.join(f'{vertex} {vertex + 1}\n' for vertex in range(100000, 150000))
+COMPRESSED_CHUNK = zlib.compress(CHUNK.encode(), 1)
+EDGES = np.fromstring(CHUNK, dtype=np.int64, sep=' ').reshape(-1, 2)
+
+
+def example_messages() -> dict:
+    """
+    :return: An example message for every status in the message interface
+    """
+
+    return {
+        message.ALIVE: lambda: message.write_alive(3),
+        message.REGISTER: lambda: message.write_register(3, 'node301', 41234, '/tmp/scaler-x1y2z3/41234.sock', 'zlib'),
+        message.META_DATA: lambda: message.write_meta_data([
+            {'worker_id': worker_id, 'number_of_edges': 100000, 'min_vertex': worker_id * 1000,
+             'max_vertex': worker_id * 1000 + 999, 'host': 'node301', 'port': 41234,
+             'socket_path': '/tmp/scaler-x1y2z3/41234.sock', 'compression': 'zlib'}
+            for worker_id in range(8)
+        ]),
+        message.DEBUG: lambda: message.write_debug(3, 'Setting up graph took 0.12345'),
+        message.RANDOM_WALKER: lambda: message.write_random_walker(list(range(123456, 123520))),
+        message.FINISH_JOB: lambda: message.write_job(message.FINISH_JOB),
+        message.JOB_COMPLETE: lambda: message.write_job(message.JOB_COMPLETE, 3),
+        message.TERMINATE: lambda: message.write(message.TERMINATE),
+        message.WORKER_FAILED: lambda: message.write_worker_failed(),
+        message.RANDOM_WALKER_COUNT: lambda: message.write_random_walker_count(3, 10),
+        message.CONTINUE: lambda: message.write_continue(),
+        message.START_SEND_FILE: lambda: message.write_start_send_file(
+            3, message.GRAPH, '5f1e0a3c9b2d4e6f8a7b1c2d3e4f5a6b-100-3',
+            '9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08'),
+        message.RESUME_FILE: lambda: message.write_resume_file(
+            3, message.BACKUP, '5f1e0a3c9b2d4e6f8a7b1c2d3e4f5a6b-101-3', 12,
+            'e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855'),
+        message.RECEIVED_FILE: lambda: message.write_received_file(3, message.GRAPH),
+        message.FILE_CHUNK: lambda: message.write_file_chunk(3, message.GRAPH, 7, CHUNK),
+        message.MISSING_CHUNK: lambda: message.write_missing_chunk(3, message.GRAPH, 7),
+        message.END_SEND_FILE: lambda: message.write_end_send_file(3, message.GRAPH, 12),
+        message.PROGRESS: lambda: message.write_progress(3, 1000),
+        message.SHARED_MEMORY: lambda: message.write_shared_memory(3, 'scaler-1a2b3c4d', 8, 100000),
+        message.COMPRESSED_FILE_CHUNK: lambda: message.write_compressed_file_chunk(
+            3, message.GRAPH, 7, COMPRESSED_CHUNK),
+        message.CHUNK_ACK: lambda: message.write_chunk_ack(3, message.GRAPH, 7, [9, 10, 12]),
+        message.INT32_EDGE_CHUNK: lambda: message.write_edge_chunk(3, message.GRAPH, 7, EDGES),
+        message.INT64_EDGE_CHUNK: lambda: message.write_edge_chunk(3, message.GRAPH, 7, EDGES + 2 ** 32),
+        message.COMPRESSED_INT32_EDGE_CHUNK: lambda: message.write_edge_chunk(3, message.GRAPH, 7, EDGES, 1),
+        message.COMPRESSED_INT64_EDGE_CHUNK: lambda: message.write_edge_chunk(3, message.GRAPH, 7, EDGES + 2 ** 32, 1),
+        message.BULK_FILE: lambda: message.write_bulk_file(
+            3, message.GRAPH, '5f1e0a3c9b2d4e6f8a7b1c2d3e4f5a6b', 12345678,
+            '9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08', 'node301', 41235,
+            '/tmp/scaler-x1y2z3/41235.sock')
+    }
+
+
+def measure(function, repetitions: int) -> float:
+    started_at = perf_counter()
+    for _ in range(repetitions):
+        function()
+
+    return perf_counter() - started_at
+
+
+def run(repetitions: int):
+    examples = example_messages()
+    assert examples.keys() == message.MESSAGE_INTERFACE.keys(), 'Every status should have an example'
+
+    print(f"{'status':>8} {'codec':>7} {'bytes':>9} {'encode/s':>12} {'decode/s':>12} {'encode MB/s':>12} {'decode MB/s':>12}")
+    for status, write_example in examples.items():
+        # Large messages need fewer repetitions to give a stable measurement
+        n = repetitions if status not in [message.FILE_CHUNK, message.COMPRESSED_FILE_CHUNK, message.INT32_EDGE_CHUNK,
+                                          message.INT64_EDGE_CHUNK, message.COMPRESSED_INT32_EDGE_CHUNK,
+                                          message.COMPRESSED_INT64_EDGE_CHUNK] else max(1, repetitions // 1000)
+
+        for name in message.CODECS.keys():
+            message.set_codec(name)
+            encoded = write_example()
+            assert str(message.read(encoded)) == str(message.read(encoded)), 'Decoding should be deterministic'
+
+            encode_time = measure(write_example, n)
+            decode_time = measure(lambda: message.read(encoded), n)
+            megabytes = len(encoded) * n / 1024 / 1024
+
+            print(f"{status:>8} {name:>7} {len(encoded):>9} {n / encode_time:>12.0f} {n / decode_time:>12.0f} "
+                  f"{megabytes / encode_time:>12.1f} {megabytes / decode_time:>12.1f}")
+
+
+if __name__ == '__main__':
+    run(get_arg("--repetitions", assert_positive_int, default='100000'))
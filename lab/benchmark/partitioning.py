@@ -0,0 +1,60 @@
+import os
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from lab.util import partitioning
+from lab.util.argument_parser import get_arg
+from lab.util.validation import assert_positive_int
+
+# Strategy and engine of every line, the greedy strategy streams the graph with the parallel engine as well
+SPLITS = [
+    (partitioning.RANGES, partitioning.STREAM),
+    (partitioning.RANGES, partitioning.NUMPY),
+    (partitioning.RANGES, partitioning.PARALLEL),
+    (partitioning.GREEDY, partitioning.STREAM),
+    (partitioning.GREEDY, partitioning.NUMPY)
+]
+
+
+def create_graph(path: str, number_of_edges: int):
+    # Sorted by start vertex like the input of the master, with 10 edges per vertex
+    with open(path, 'w') as f:
+        f.writelines(f'{edge // 10} {(edge * 7919) % number_of_edges // 10}\n' for edge in range(number_of_edges))
+
+
+def split_graph(strategy: str, engine: str, graph_path: str, sub_graph_paths: list):
+    if strategy == partitioning.GREEDY and engine == partitioning.NUMPY:
+        partitioning.split_graph_greedy_in_memory(graph_path, sub_graph_paths)
+    elif strategy == partitioning.GREEDY:
+        partitioning.split_graph_greedy(graph_path, sub_graph_paths)
+    elif engine == partitioning.NUMPY:
+        partitioning.split_graph_in_memory(graph_path, sub_graph_paths)
+    elif engine == partitioning.PARALLEL:
+        partitioning.split_graph_in_parallel(graph_path, sub_graph_paths)
+    else:
+        partitioning.split_graph(graph_path, sub_graph_paths)
+
+
+def run(number_of_edges: int, number_of_workers: int):
+    print(f"{'edges':>10} {'workers':>8} {'strategy':>8} {'engine':>8} {'seconds':>9} {'edges/s':>12}")
+
+    with TemporaryDirectory() as directory:
+        graph_path = os.path.join(directory, 'graph.txt')
+        sub_graph_paths = [os.path.join(directory, f'worker-{worker_id}.txt') for worker_id in range(number_of_workers)]
+
+        # Partitioning is linear when doubling the graph doubles the time
+        for edges in [number_of_edges // 4, number_of_edges // 2, number_of_edges]:
+            create_graph(graph_path, edges)
+
+            for strategy, engine in SPLITS:
+                started_at = perf_counter()
+                split_graph(strategy, engine, graph_path, sub_graph_paths)
+                duration = perf_counter() - started_at
+
+                print(f"{edges:>10} {number_of_workers:>8} {strategy:>8} {engine:>8} {duration:>9.3f} "
+                      f"{edges / duration:>12.0f}")
+
+
+if __name__ == '__main__':
+    run(get_arg("--edges", assert_positive_int, default='1000000'),
+        get_arg("--workers", assert_positive_int, default='4'))
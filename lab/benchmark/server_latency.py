@@ -0,0 +1,94 @@
+import resource
+from multiprocessing import Process, Queue
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import perf_counter, perf_counter_ns, sleep
+
+import numpy as np
+
+from lab.util import message, server, sockets
+from lab.util.argument_parser import get_arg
+from lab.util.server import Server
+from lab.util.validation import assert_positive_int
+
+
+def get_cpu_time(who=resource.RUSAGE_SELF) -> float:
+    usage = resource.getrusage(who)
+
+    return usage.ru_utime + usage.ru_stime
+
+
+def send_messages(host: str, port: int, number_of_messages: int, interval: float, results: Queue):
+    """
+    Sends PROGRESS messages that carry the time at which they were sent (Linux: shared monotonic clock)
+    """
+
+    for _ in range(number_of_messages):
+        sockets.send_message(host, port, message.write_progress(0, perf_counter_ns()))
+
+        if interval > 0:
+            sleep(interval)
+
+    results.put(get_cpu_time())
+
+
+class LatencyServer(Server):
+    def __init__(self):
+        super().__init__()
+        self.latencies = []
+        self.message_interface = {
+            message.PROGRESS: self.handle_progress
+        }
+
+    def handle_progress(self, worker_id, sent_at):
+        self.latencies.append(perf_counter_ns() - sent_at)
+
+
+def measure(mode: str, unix_sockets: bool, number_of_messages: int, interval: float):
+    server.set_mode(mode)
+    sockets.set_socket_dir(mkdtemp(prefix='scaler-') if unix_sockets else None)
+    receiver = LatencyServer()
+    sockets.register_unix_socket(receiver.hostname, receiver.port, receiver.socket_path)
+    results = Queue()
+    cpu_time_at_start = get_cpu_time() + get_cpu_time(resource.RUSAGE_CHILDREN)
+
+    sender = Process(target=send_messages, args=(receiver.hostname, receiver.port, number_of_messages, interval, results))
+    started_at = perf_counter()
+    sender.start()
+
+    while len(receiver.latencies) < number_of_messages:
+        status, *args = receiver.get_message_from_queue()
+        receiver.message_interface[status](*args)
+
+    duration = perf_counter() - started_at
+    sender_cpu_time = results.get()
+    sender.join()
+
+    receiver.server.terminate()
+    if mode == server.PROCESS:
+        receiver.server.process.join()
+    if unix_sockets:
+        rmtree(sockets.socket_dir, ignore_errors=True)
+        sockets.unix_socket_paths.clear()
+
+    # The server process is a child as well, the CPU time of the sender is not part of receiving
+    cpu_time = get_cpu_time() + get_cpu_time(resource.RUSAGE_CHILDREN) - cpu_time_at_start - sender_cpu_time
+    latencies = np.array(receiver.latencies) / 1000
+
+    print(f"{mode:>8} {'unix' if unix_sockets else 'tcp':>9} {interval * 1000:>9.1f} {number_of_messages / duration:>12.0f} "
+          f"{np.median(latencies):>12.1f} {np.percentile(latencies, 99):>12.1f} "
+          f"{cpu_time / number_of_messages * 1e6:>14.1f}")
+
+
+def run(number_of_messages: int):
+    print(f"{'mode':>8} {'transport':>9} {'pause ms':>9} {'messages/s':>12} {'median µs':>12} {'p99 µs':>12} {'CPU µs/message':>14}")
+
+    # Paced messages show the latency of the pipeline, a burst its throughput
+    for interval in [0.001, 0]:
+        for mode in [server.PROCESS, server.ASYNCIO]:
+            for unix_sockets in [False, True]:
+                measure(mode, unix_sockets, number_of_messages, interval)
+
+
+if __name__ == '__main__':
+    run(get_arg("--messages", assert_positive_int, default='10000'))
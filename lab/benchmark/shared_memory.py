@@ -0,0 +1,202 @@
+import gc
+import os
+from multiprocessing import Process
+from tempfile import mkstemp
+from time import perf_counter
+from uuid import uuid4
+
+import numpy as np
+
+from lab.util import message, server, sockets
+from lab.util.argument_parser import get_arg
+from lab.util.distributed_graph import DistributedGraph
+from lab.util.file_io import read_lines, read_edges_as_array, write_to_file
+from lab.util.file_transfer import FileSender, FileReceiver
+from lab.util.server import Server
+from lab.util.shared_memory import SharedRun, SharedRing, RANDOM_WALKER_RING_CAPACITY
+from lab.util.validation import assert_positive_int
+
+BATCH_SIZE = 256
+# Every sub graph is delivered this often, the fastest time counts
+REPETITIONS = 3
+
+
+class RandomWalkerServer(Server):
+    def __init__(self):
+        super().__init__()
+        self.number_of_random_walkers = 0
+        self.file_receiver = None
+        self.message_interface = {
+            message.RANDOM_WALKER: self.handle_random_walker,
+            message.START_SEND_FILE: self.handle_start_send_file,
+            message.FILE_CHUNK: self.handle_file_chunk,
+            message.END_SEND_FILE: self.handle_end_send_file
+        }
+
+    def handle_random_walker(self, vertex_labels):
+        self.number_of_random_walkers += len(vertex_labels)
+
+    def handle_start_send_file(self, worker_id, file_type, transfer_id, content_hash, resume):
+        self.file_receiver = FileReceiver(spill_to_disk=True)
+
+    def handle_file_chunk(self, worker_id, file_type, index, chunk):
+        self.file_receiver.receive_chunk(index, chunk)
+
+    def handle_end_send_file(self, worker_id, file_type, number_of_chunks):
+        self.file_receiver.handle_end_send_file(number_of_chunks)
+
+
+def create_partition(path: str, number_of_edges: int):
+    # Sorted like the sub graphs of the master, with 10 edges per vertex
+    start_vertices = np.arange(number_of_edges) // 10
+    end_vertices = np.random.randint(0, number_of_edges // 10, number_of_edges)
+    write_to_file(path, [f'{start} {end}\n' for start, end in zip(start_vertices, end_vertices)])
+
+
+def deliver_graph_over_sockets(path: str) -> (float, float):
+    """
+    :return: Time until the worker has the sub graph as an array, time to build the graph of the worker
+    """
+
+    # The chunks are sent before any is handled, so they are received in a separate process
+    server.set_mode(server.PROCESS)
+    receiver = RandomWalkerServer()
+    started_at = perf_counter()
+
+    file_sender = FileSender(0, message.GRAPH, read_lines(path))
+    sockets.send_message(receiver.hostname, receiver.port, message.write_start_send_file(
+        0, message.GRAPH, file_sender.transfer_id))
+    # Without acknowledgements, the receiver does not handle messages before all chunks are sent
+    for chunk_message in iter(file_sender.read_next_message, None):
+        sockets.send_message(receiver.hostname, receiver.port, chunk_message)
+    sockets.send_message(receiver.hostname, receiver.port, message.write_end_send_file(
+        0, message.GRAPH, file_sender.next_index))
+
+    receiver.wait_for_messages(lambda: receiver.file_receiver is not None
+                               and receiver.file_receiver.received_complete_file)
+    edges = receiver.file_receiver.read_edges()
+    received_at = perf_counter()
+
+    built_at = received_at + build_graph(edges)
+
+    sockets.close_connection(receiver.hostname, receiver.port)
+    receiver.server.terminate()
+
+    return received_at - started_at, built_at - received_at
+
+
+def deliver_graph_in_shared_memory(path: str) -> (float, float):
+    """
+    :return: Time until the worker has the sub graph as an array, which includes parsing it on the master, time to
+        build the graph of the worker
+    """
+
+    started_at = perf_counter()
+
+    master_run = SharedRun(f'scaler-{uuid4().hex[:8]}', 1)
+    master_run.create({0: read_edges_as_array(path)})
+    worker_run = SharedRun(master_run.prefix, 1)
+    worker_run.attach(0, len(master_run.graphs[0].array))
+    received_at = perf_counter()
+
+    built_at = received_at + build_graph(worker_run.graphs[0].array)
+
+    worker_run.close()
+    master_run.close()
+
+    return received_at - started_at, built_at - received_at
+
+
+def build_graph(edges: np.ndarray) -> float:
+    """
+    :return: Time to build the graph of a worker, which is the same for both paths
+    """
+
+    # Garbage of an earlier graph would otherwise be collected while this one is built
+    gc.collect()
+    started_at = perf_counter()
+    DistributedGraph(distributed=False).load_from_array(edges)
+
+    return perf_counter() - started_at
+
+
+def send_random_walkers(host: str, port: int, number_of_random_walkers: int):
+    for start in range(0, number_of_random_walkers, BATCH_SIZE):
+        vertex_labels = list(range(start, min(start + BATCH_SIZE, number_of_random_walkers)))
+        sockets.send_message(host, port, message.write_random_walker(vertex_labels))
+
+
+def push_random_walkers(name: str, number_of_random_walkers: int):
+    ring = SharedRing(name, RANDOM_WALKER_RING_CAPACITY)
+
+    for start in range(0, number_of_random_walkers, BATCH_SIZE):
+        vertex_labels = list(range(start, min(start + BATCH_SIZE, number_of_random_walkers)))
+        while len(vertex_labels) > 0:
+            number_pushed = ring.push(vertex_labels)
+            vertex_labels = vertex_labels[number_pushed:]
+
+            if number_pushed == 0:
+                # Let the consumer run while the ring is full
+                os.sched_yield()
+
+    ring.close()
+
+
+def hand_off_over_sockets(number_of_random_walkers: int) -> float:
+    server.set_mode(server.ASYNCIO)
+    receiver = RandomWalkerServer()
+    started_at = perf_counter()
+
+    sender = Process(target=send_random_walkers, args=(receiver.hostname, receiver.port, number_of_random_walkers))
+    sender.start()
+    receiver.wait_for_messages(lambda: receiver.number_of_random_walkers >= number_of_random_walkers)
+    duration = perf_counter() - started_at
+
+    sender.join()
+    receiver.server.terminate()
+
+    return duration
+
+
+def hand_off_in_shared_memory(number_of_random_walkers: int) -> float:
+    ring = SharedRing(f'scaler-{uuid4().hex[:8]}', RANDOM_WALKER_RING_CAPACITY, create=True)
+    received = 0
+    started_at = perf_counter()
+
+    sender = Process(target=push_random_walkers, args=(ring.memory.name, number_of_random_walkers))
+    sender.start()
+    while received < number_of_random_walkers:
+        number_popped = len(ring.pop_all())
+        received += number_popped
+
+        if number_popped == 0:
+            os.sched_yield()
+    duration = perf_counter() - started_at
+
+    sender.join()
+    ring.close()
+
+    return duration
+
+
+def run(number_of_edges: int, number_of_random_walkers: int):
+    _, path = mkstemp(suffix='.txt')
+    create_partition(path, number_of_edges)
+
+    print(f"Sub graph of {number_of_edges} edges")
+    print(f"{'path':>8} {'deliver s':>10} {'build s':>10}")
+    for name, deliver in [('sockets', deliver_graph_over_sockets), ('shared', deliver_graph_in_shared_memory)]:
+        delivery_time, build_time = np.min([deliver(path) for _ in range(REPETITIONS)], axis=0)
+        print(f"{name:>8} {delivery_time:>10.3f} {build_time:>10.3f}")
+    os.remove(path)
+
+    print()
+    print(f"Hand-off of {number_of_random_walkers} random walkers in batches of {BATCH_SIZE}")
+    print(f"{'path':>8} {'walkers/s':>12}")
+    for name, hand_off in [('sockets', hand_off_over_sockets), ('shared', hand_off_in_shared_memory)]:
+        print(f"{name:>8} {number_of_random_walkers / hand_off(number_of_random_walkers):>12.0f}")
+
+
+if __name__ == '__main__':
+    run(get_arg("--edges", assert_positive_int, default='1000000'),
+        get_arg("--random-walkers", assert_positive_int, default='1000000'))
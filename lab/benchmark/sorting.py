@@ -0,0 +1,63 @@
+import os
+import shutil
+import subprocess
+import tracemalloc
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+import numpy as np
+
+from lab.util import file_io
+from lab.util.argument_parser import get_arg
+from lab.util.validation import assert_positive_int
+
+
+def create_graph(path: str, number_of_edges: int):
+    # Shuffled like the sub graphs before they are sorted, with 10 edges per vertex
+    edges = np.stack([np.arange(number_of_edges) // 10, np.arange(number_of_edges) * 7919 % number_of_edges // 10], 1)
+    file_io.write_edges(path, edges[np.random.default_rng(0).permutation(number_of_edges)])
+
+
+def measure(graph_path: str, path: str, memory: int) -> (float, int):
+    """
+    :return: Time to sort the graph with `file_io.sort_file`, peak memory of the Python objects and arrays
+    """
+
+    shutil.copy(graph_path, path)
+
+    tracemalloc.start()
+    started_at = perf_counter()
+    file_io.sort_file(path, memory)
+    duration = perf_counter() - started_at
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return duration, peak
+
+
+def run(number_of_edges: int, memory: int):
+    print(f"{'edges':>10} {'memory MB':>10} {'runs':>5} {'seconds':>9} {'edges/s':>12} {'peak MB':>8} {'sort -n':>8}")
+
+    with TemporaryDirectory() as directory:
+        graph_path = os.path.join(directory, 'graph.txt')
+        path = os.path.join(directory, 'sorted.txt')
+
+        # Sorting is about linear when doubling the graph doubles the time, the smaller memory merges more runs
+        for edges in [number_of_edges // 4, number_of_edges // 2, number_of_edges]:
+            create_graph(graph_path, edges)
+            size = os.path.getsize(graph_path)
+
+            started_at = perf_counter()
+            subprocess.run(['sort', '-n', '-k1,1', '-k2,2', '-o', path, graph_path], check=True)
+            reference = perf_counter() - started_at
+
+            for sort_memory in [8 * size, memory, memory // 4]:
+                duration, peak = measure(graph_path, path, sort_memory)
+                runs = -(-size // (sort_memory // 8))
+                print(f"{edges:>10} {sort_memory / 1024 / 1024:>10.1f} {runs:>5} {duration:>9.3f} "
+                      f"{edges / duration:>12.0f} {peak / 1024 / 1024:>8.1f} {reference:>8.3f}")
+
+
+if __name__ == '__main__':
+    run(get_arg("--edges", assert_positive_int, default='4000000'),
+        get_arg("--memory", assert_positive_int, default='64') * 1024 * 1024)
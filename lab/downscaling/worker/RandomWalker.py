@@ -1,5 +1,7 @@
 from lab.util.distributed_graph import Vertex, ForeignVertex, Edge
 from numpy.random import randint
+from time import time
+from typing import Dict, List
 
 
 class ForeignVertexException(Exception):
@@ -26,3 +28,43 @@ class RandomWalker:
             edge = self.get_random_edge()
             self.vertex = edge.to_vertex
             return edge
+
+
+class RandomWalkerBatch:
+    """ Collects the vertex labels of random walkers that leave this worker per destination worker, so they can
+    be handed off in a single message per worker.
+    """
+
+    def __init__(self, max_size: int, max_delay: float):
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.vertex_labels: Dict[int, List[int]] = {}
+        self.first_added_at: Dict[int, float] = {}
+
+    def __len__(self):
+        return sum([len(vertex_labels) for vertex_labels in self.vertex_labels.values()])
+
+    def add(self, worker_id: int, vertex_label: int):
+        if worker_id not in self.vertex_labels:
+            self.vertex_labels[worker_id] = []
+            self.first_added_at[worker_id] = time()
+
+        self.vertex_labels[worker_id].append(vertex_label)
+
+    def pop_ready(self, force: bool = False) -> Dict[int, List[int]]:
+        """
+        Removes the batches that are full or have waited long enough
+
+        :param force: Return all batches, regardless of their size and age
+        :return: Vertex labels per destination worker
+        """
+
+        ready = {}
+
+        for worker_id in list(self.vertex_labels.keys()):
+            if force or len(self.vertex_labels[worker_id]) >= self.max_size \
+                    or time() - self.first_added_at[worker_id] >= self.max_delay:
+                ready[worker_id] = self.vertex_labels.pop(worker_id)
+                del self.first_added_at[worker_id]
+
+        return ready
@@ -1,10 +1,15 @@
 from lab.master.WorkerInterface import WorkerInterface
 from lab.util.distributed_graph import DistributedGraph, ForeignVertex, Vertex, Edge
-from lab.downscaling.worker.RandomWalker import RandomWalker, ForeignVertexException
+from lab.downscaling.worker.RandomWalker import RandomWalker, ForeignVertexException, RandomWalkerBatch
 from numpy.random import randint, random
 from numpy import array
-from lab.util import message, file_io
-from time import sleep, time
+from lab.util import message
+from time import time
+
+# Random walkers that leave the worker are handed off per destination in batches of at most this size
+RANDOM_WALKER_BATCH_SIZE = 256
+# Maximum time in seconds a random walker waits in a batch before it is handed off
+RANDOM_WALKER_BATCH_DELAY = 0.005
 
 
 class Worker(WorkerInterface):
@@ -20,10 +25,14 @@ class Worker(WorkerInterface):
             message.WORKER_FAILED: self.handle_worker_failed,
             message.CONTINUE: self.handle_continue,
             message.START_SEND_FILE: self.handle_start_send_file,
+            message.RESUME_FILE: self.handle_resume_file,
+            message.BULK_FILE: self.handle_bulk_file,
             message.FILE_CHUNK: self.handle_file_chunk,
             message.END_SEND_FILE: self.handle_end_send_file,
             message.MISSING_CHUNK: self.handle_missing_chunk,
-            message.RECEIVED_FILE: self.handle_received_file
+            message.CHUNK_ACK: self.handle_chunk_ack,
+            message.RECEIVED_FILE: self.handle_received_file,
+            message.SHARED_MEMORY: self.handle_shared_memory
         }
 
         self.running = False
@@ -37,17 +46,22 @@ class Worker(WorkerInterface):
 
         self.number_of_random_walkers = number_of_random_walkers
         self.add_random_walker_at = []
+        self.outgoing_random_walkers = RandomWalkerBatch(
+            RANDOM_WALKER_BATCH_SIZE, RANDOM_WALKER_BATCH_DELAY)
 
+        receive_graph_started_at = time()
         self.receive_graph()
+        if self.file_receivers[message.GRAPH] is not None:
+            receive_graph_started_at = self.file_receivers[message.GRAPH].started_at
         self.send_debug_message(
-            f"Receiving graph took {time() - self.file_receivers[message.GRAPH].started_at}")
+            f"Receiving graph took {time() - receive_graph_started_at}")
         setup_graph_started_at = time()
+        edges = self.get_graph_edges()
 
         if method == "random_edge":
             self.scale = scale
             self.edges = []
-            for line in self.file_receivers[message.GRAPH].file:
-                vertex1_label, vertex2_label = file_io.parse_to_edge(line)
+            for vertex1_label, vertex2_label in edges.tolist():
                 self.edges.append(
                     Edge(Vertex(vertex1_label), Vertex(vertex2_label)))
             self.edges = array(self.edges)
@@ -57,8 +71,9 @@ class Worker(WorkerInterface):
             self.wait_until_continue()
             self.run_random_edge()
         elif method == "random_walk":
-            self.graph = DistributedGraph(
-                worker_id, self.combined_meta_data, self.file_receivers[message.GRAPH].file)
+            self.graph = DistributedGraph(worker_id, self.combined_meta_data)
+            self.graph.load_from_array(edges)
+
             self.random_walkers = [
                 RandomWalker(self.get_random_vertex()) for _ in range(number_of_random_walkers)
             ]
@@ -79,9 +94,8 @@ class Worker(WorkerInterface):
             self.run_random_walk()
 
     def build_from_backup(self):
-        while self.file_receivers[message.BACKUP] is None or not self.file_receivers[message.BACKUP].received_complete_file:
-            self.handle_queue()
-            sleep(0.1)
+        self.wait_for_messages(lambda: self.file_receivers[message.BACKUP] is not None
+                               and self.file_receivers[message.BACKUP].received_complete_file)
 
         collected_edges = {}
 
@@ -107,14 +121,15 @@ class Worker(WorkerInterface):
             except KeyError:
                 pass
 
-    def handle_random_walker(self, vertex_label: int):
+    def handle_random_walker(self, vertex_labels: list):
         # If worker is still being setup after crash and receives a message from another already running worker
         if not hasattr(self, 'random_walkers'):
-            self.add_random_walker_at.append(vertex_label)
+            self.add_random_walker_at += vertex_labels
             return
 
-        self.random_walkers.append(RandomWalker(
-            self.graph.vertices[vertex_label]))
+        for vertex_label in vertex_labels:
+            self.random_walkers.append(RandomWalker(
+                self.graph.vertices[vertex_label]))
 
     def handle_continue(self):
         self.running = True
@@ -122,6 +137,9 @@ class Worker(WorkerInterface):
     def handle_worker_failed(self):
         self.running = False
 
+        # Random walkers in the rings towards this worker are counted here, before they are forgotten
+        self.receive_shared_random_walkers()
+
         # If worker is still being setup after crash and receives a message from another already running worker
         if not hasattr(self, 'random_walkers'):
             number_of_random_walkers = self.number_of_random_walkers + \
@@ -129,21 +147,57 @@ class Worker(WorkerInterface):
         else:
             number_of_random_walkers = len(self.random_walkers)
 
+        # Random walkers waiting to be handed off are still owned by this worker
+        number_of_random_walkers += len(self.outgoing_random_walkers)
+
         self.send_message_to_master(message.write_random_walker_count(
             self.worker_id, number_of_random_walkers))
         self.wait_until_continue()
 
     def wait_until_continue(self):
-        while not self.running:
-            self.handle_queue()
-            sleep(0.01)
+        self.wait_for_messages(lambda: self.running)
 
     def send_random_walker_message(self, vertex: ForeignVertex):
-        self.send_message_to_node(
-            *self.combined_meta_data.get_connection_that_has_vertex(vertex.label),
-            message.write_random_walker(vertex.label)
+        self.outgoing_random_walkers.add(
+            self.combined_meta_data.get_worker_id_that_has_vertex(vertex.label),
+            vertex.label
         )
 
+    def send_random_walker_batches(self, force: bool = False):
+        """
+        Hands off the batches of random walkers that are full or have waited long enough
+
+        :param force: Send all batches, regardless of their size and age
+        """
+
+        for worker_id, vertex_labels in self.outgoing_random_walkers.pop_ready(force).items():
+            if self.shared_run is not None:
+                number_pushed = self.shared_run.rings[(self.worker_id, worker_id)].push(vertex_labels)
+
+                # Try again later when the ring is full
+                for vertex_label in vertex_labels[number_pushed:]:
+                    self.outgoing_random_walkers.add(worker_id, vertex_label)
+                continue
+
+            try:
+                self.send_message_to_node(
+                    *self.combined_meta_data[worker_id].get_connection_info(),
+                    message.write_random_walker(vertex_labels)
+                )
+            except ConnectionRefusedError:
+                # Try again later, e.g. after the worker has been restarted
+                for vertex_label in vertex_labels:
+                    self.outgoing_random_walkers.add(worker_id, vertex_label)
+
+    def receive_shared_random_walkers(self):
+        if self.shared_run is None:
+            return
+
+        for ring in self.shared_run.get_incoming_rings(self.worker_id):
+            vertex_labels = ring.pop_all()
+            if len(vertex_labels) > 0:
+                self.handle_random_walker(vertex_labels)
+
     def run_random_edge(self):
         """
         Runs the worker
@@ -164,6 +218,7 @@ class Worker(WorkerInterface):
 
         while not self.cancel:
             self.handle_queue()
+            self.receive_shared_random_walkers()
 
             for _ in range(self.walking_iterations):
                 for random_walker in self.random_walkers:
@@ -174,14 +229,13 @@ class Worker(WorkerInterface):
                             self.collected_edges[str(edge)] = True
                             new_edges.append(str(edge) + "\n")
                     except ForeignVertexException:
-                        try:
-                            self.send_random_walker_message(
-                                random_walker.vertex)
-                        except ConnectionRefusedError:
-                            continue
-
+                        self.send_random_walker_message(random_walker.vertex)
                         self.random_walkers.remove(random_walker)
 
+            # Without random walkers left there is no reason to wait for a batch to fill up
+            self.send_random_walker_batches(
+                force=len(self.random_walkers) == 0)
+
             # Make sure to not overload the master with progress messages
             if len(self.collected_edges) % 100 == 0 and last_progress_message_at != len(self.collected_edges):
                 self.send_progress_message(len(self.collected_edges))
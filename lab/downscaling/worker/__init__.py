@@ -6,8 +6,15 @@ from lab.util.validation import (
     assert_host,
     assert_bool,
     assert_pos_float,
-    assert_downscaling_method)
+    assert_downscaling_method,
+    assert_message_codec,
+    assert_server_mode,
+    assert_socket_dir,
+    assert_compression,
+    assert_cache_dir,
+    assert_edge_format)
 from lab.downscaling.worker.Worker import Worker
+from lab.util import message, server, sockets, file_transfer, partition_cache
 
 
 def main():
@@ -28,6 +35,19 @@ def main():
             "--backup-size", assert_nonnegative_int, default=100)
         walking_iterations = get_arg(
             "--walking-iterations", assert_positive_int, default=1)
+        message_codec = get_arg(
+            "--message-codec", assert_message_codec, default='binary')
+        server_mode = get_arg(
+            "--server-mode", assert_server_mode, default='process')
+        socket_dir = get_arg(
+            "--socket-dir", assert_socket_dir, default='')
+        compression = get_arg(
+            "--compression", assert_compression, default='zlib')
+        edge_format = get_arg(
+            "--edge-format", assert_edge_format, default='binary')
+        cache_dir = get_arg("--cache-dir", assert_cache_dir, default='')
+        cache_size = get_arg(
+            "--cache-size", assert_nonnegative_int, default='0')
 
     except AssertionError as e:
         print_error(e)
@@ -42,9 +62,23 @@ def main():
             "\t--n-random-walkers: Number of random walkers to start with\n"
             "\t--backup-size: Minimum size of the backup before it will be send to the master during a run, 0 if you want no backups\n"
             "\t--walking-iterations: The number of steps a random walker sets before the queue will be handled\n"
+            "\t--message-codec: Encoding of the messages, `binary` or `json` (for debugging)\n"
+            "\t--server-mode: How messages are received, `process` (default) or `asyncio`\n"
+            "\t--socket-dir: Directory for the Unix domain sockets of a single host run, empty to only use TCP\n"
+            "\t--compression: Compression of graph and backup transfers this worker accepts, `zlib` or `none`\n"
+            "\t--edge-format: How this worker sends edges in backups, `binary` or `text`\n"
+            "\t--cache-dir: Directory of the sub graph cache of this host, empty for the default\n"
+            "\t--cache-size: Maximum size of the sub graph cache of this host in MB, 0 to not cache\n"
         )
         return
 
+    message.set_codec(message_codec)
+    server.set_mode(server_mode)
+    sockets.set_socket_dir(socket_dir)
+    file_transfer.set_compression(compression)
+    file_transfer.set_edge_format(edge_format)
+    partition_cache.set_cache(cache_dir, cache_size * 1024 * 1024)
+
     Worker(worker_id, master_host, master_port, scale, method, load_backup,
            number_of_random_walkers, backup_size, walking_iterations)
 
@@ -5,22 +5,28 @@ from math import ceil
 
 from lab.master.worker_info import WorkerInfoCollection, WorkerInfo
 from lab.util.distributed_graph import DistributedGraph
-from lab.util import message, sockets
-from lab.util.file_io import read_in_chunks, get_start_vertex, get_first_line, get_last_line, read_as_reversed_edges, \
-    append_edge, get_number_of_lines, write_to_file, read_file
-from lab.util.file_transfer import FileSender, UnexpectedChunkIndex, FileReceiver
+from lab.util import message, sockets, file_transfer, bulk_transfer, partition_cache, partitioning
+from lab.util.bulk_transfer import BulkFile, FileServer
+from lab.util.file_io import get_start_vertex, get_first_line, get_last_line, get_number_of_lines, read_lines, \
+    read_edges_as_array, get_file_hash
+from lab.util.file_transfer import FileSender, UnexpectedChunkIndex, FileReceiver, send_files, \
+    agree_on_compression
 from lab.util.server import Server
 from lab.util.meta_data import MetaData
+from lab.util.shared_memory import SharedRun
 
 # You should create this file yourself in order to run the program using ssh
 # by default, let shared_filesystem = 0
 from lab.util.ssh_connection_info import shared_filesystem
 
+# Seconds between checks for crashed workers while waiting for messages
+CONTROL_INTERVAL = 0.1
+
 
 class Master(Server):
     def __init__(self, worker_hostnames: list, graph_path: str, worker_script: str, split_graph: bool, output_file: str,
                  scale: float, method: str = '', random_walkers_per_worker: int = 1, backup_size: int = 0, walking_iterations: int = 1,
-                 show_debug_messages: bool = True):
+                 show_debug_messages: bool = True, shared_memory: bool = False):
         started_at = time()
         super().__init__()
         self.worker_script = worker_script
@@ -33,6 +39,14 @@ class Master(Server):
         self.backup_size = backup_size
         self.walking_iterations = walking_iterations
         self.show_debug_messages = show_debug_messages
+        self.shared_memory = shared_memory
+        self.shared_run = None
+        # Serves the sub graphs for bulk transfers, started with the first of them
+        self.file_server = None
+        # Part of the ids of the transfers of this run, see send_files_to_workers
+        self.run_id = uuid4().hex
+        # Original label of every vertex if the greedy partition strategy numbered them again, None otherwise
+        self.vertex_labels = None
 
         self.random_walker_counts_received = 0
 
@@ -48,8 +62,10 @@ class Master(Server):
             message.JOB_COMPLETE: self.handle_job_complete,
             message.RANDOM_WALKER_COUNT: self.handle_random_walker_count,
             message.MISSING_CHUNK: self.handle_missing_chunk,
+            message.CHUNK_ACK: self.handle_chunk_ack,
             message.RECEIVED_FILE: self.handle_received_file,
             message.START_SEND_FILE: self.handle_start_send_file,
+            message.RESUME_FILE: self.handle_resume_file,
             message.END_SEND_FILE: self.handle_end_send_file,
             message.FILE_CHUNK: self.handle_file_chunk,
             message.PROGRESS: self.handle_progress
@@ -93,15 +109,52 @@ class Master(Server):
     def get_goal_size(self):
         return self.worker_info_collection.get_total_number_of_edges() * self.scale
 
-    def send_graph_to_worker(self, worker_id):
-        data = read_file(
-            self.worker_info_collection[worker_id].input_sub_graph_path)
-        self.send_data_to_worker(worker_id, data, message.GRAPH)
-        self.debug(f'Worker {worker_id} received graph')
+    def send_graphs_to_workers(self, worker_ids: list = None):
+        """
+        Sends the sub graphs to the workers, to all of them at the same time
+
+        :param worker_ids: Ids of the workers, None for all workers
+        """
+
+        if worker_ids is None:
+            worker_ids = list(self.worker_info_collection.keys())
+
+        if self.shared_run is not None:
+            for worker_id in worker_ids:
+                self.worker_info_collection[worker_id].attached = False
+                self.send_message_to_worker(worker_id, message.write_shared_memory(
+                    worker_id, self.shared_run.prefix, self.shared_run.number_of_workers,
+                    len(self.shared_run.graphs[worker_id].array)))
+
+            self.wait_for_messages(lambda: all(self.worker_info_collection[worker_id].attached
+                                               for worker_id in worker_ids))
+            for worker_id in worker_ids:
+                self.debug(f'Worker {worker_id} received shared memory')
+            return
 
-    def send_graphs_to_workers(self):
-        for worker_id in self.worker_info_collection.keys():
-            self.send_graph_to_worker(worker_id)
+        # Workers that cached the same sub graph in an earlier run confirm without receiving it
+        files = [
+            (worker_id, message.GRAPH, self.worker_info_collection[worker_id].input_sub_graph_path)
+            for worker_id in worker_ids
+        ]
+
+        if bulk_transfer.enabled:
+            self.send_files_in_bulk(files)
+        else:
+            self.send_files_to_workers([
+                (worker_id, file_type, read_lines(path), self.get_content_hash(worker_id))
+                for worker_id, file_type, path in files
+            ])
+
+        for worker_id in worker_ids:
+            self.debug(f'Worker {worker_id} received graph')
+
+    def get_content_hash(self, worker_id: int) -> str:
+        # Checking the hash of the received sub graph is only worth it if the workers cache it
+        if partition_cache.cache_size <= 0:
+            return ''
+
+        return self.worker_info_collection[worker_id].meta_data.content_hash
 
     def process_graph(self, graph_path: str, split_graph: bool) -> [MetaData]:
         """
@@ -113,20 +166,12 @@ class Master(Server):
         """
 
         if split_graph:
-            # Split graph into self.n_workers sub graphs
+            # Split graph into self.n_workers sorted sub graphs with their reverse edges
             self.split_graph(graph_path)
 
-            # Add reverse edges to sub graphs
-            self.make_sub_graphs_bidirectional(graph_path)
-
-            # Sort sub graphs
-            self.worker_info_collection.sort_sub_graphs()
-
-            # Update meta data
-            self.worker_info_collection.update_meta_data()
-
         else:
             # TODO do not duplicate data
+            content_hash = get_file_hash(graph_path)
             for worker_id, hostname in enumerate(self.worker_hostnames):
                 self.worker_info_collection[worker_id] = WorkerInfo(
                     hostname=hostname,
@@ -137,50 +182,36 @@ class Master(Server):
                         number_of_edges=get_number_of_lines(graph_path),
                         min_vertex=get_start_vertex(
                             get_first_line(graph_path)),
-                        max_vertex=get_start_vertex(get_last_line(graph_path))
+                        max_vertex=get_start_vertex(get_last_line(graph_path)),
+                        content_hash=content_hash
                     )
                 )
 
     def split_graph(self, graph_path):
-        f = open(graph_path, "r")
-        for worker_id, sub_graph in enumerate(read_in_chunks(f, len(self.worker_hostnames))):
-            sub_graph_path = self.random_temp_file(f'input-worker-{worker_id}')
-            write_to_file(sub_graph_path, sub_graph)
-
-            self.worker_info_collection[worker_id] = WorkerInfo(
-                hostname=self.worker_hostnames[worker_id],
-                worker_id=worker_id,
-                input_sub_graph_path=sub_graph_path,
-                meta_data=MetaData(
-                    worker_id=worker_id,
-                    number_of_edges=get_number_of_lines(sub_graph_path),
-                    min_vertex=get_start_vertex(
-                        get_first_line(sub_graph_path)),
-                    max_vertex=get_start_vertex(get_last_line(sub_graph_path))
-                )
-            )
-        f.close()
-
-    def make_sub_graphs_bidirectional(self, graph_path: str):
-        combined_meta_data = self.worker_info_collection.get_combined_meta_data()
-
-        f = open(graph_path, "r")
-        for edge in read_as_reversed_edges(f):
-            start_vertex = get_start_vertex(edge)
+        sub_graph_paths = [self.random_temp_file(f'input-worker-{worker_id}')
+                           for worker_id in range(len(self.worker_hostnames))]
+
+        if partitioning.strategy == partitioning.GREEDY and partitioning.engine == partitioning.NUMPY:
+            all_meta_data, self.vertex_labels = partitioning.split_graph_greedy_in_memory(graph_path, sub_graph_paths)
+        elif partitioning.strategy == partitioning.GREEDY:
+            all_meta_data, self.vertex_labels = partitioning.split_graph_greedy(graph_path, sub_graph_paths)
+        elif partitioning.engine == partitioning.NUMPY:
+            all_meta_data = partitioning.split_graph_in_memory(graph_path, sub_graph_paths)
+        elif partitioning.engine == partitioning.PARALLEL:
+            all_meta_data = partitioning.split_graph_in_parallel(graph_path, sub_graph_paths)
+        else:
+            all_meta_data = partitioning.split_graph(graph_path, sub_graph_paths)
 
-            if start_vertex < combined_meta_data.bottom_layer.min_vertex:
-                worker_id = combined_meta_data.bottom_layer.worker_id
-            elif start_vertex > combined_meta_data.top_layer.max_vertex:
-                worker_id = combined_meta_data.top_layer.worker_id
-            else:
-                worker_id = combined_meta_data.get_worker_id_that_has_vertex(
-                    start_vertex)
+        # Every cut edge is a step a random walker takes to another worker
+        self.debug(f'Edge cut ratio: {partitioning.get_edge_cut_ratio(all_meta_data):.5f}')
 
-            append_edge(
-                path=self.worker_info_collection[worker_id].input_sub_graph_path,
-                edge=edge
+        for meta_data in all_meta_data:
+            self.worker_info_collection[meta_data.worker_id] = WorkerInfo(
+                hostname=self.worker_hostnames[meta_data.worker_id],
+                worker_id=meta_data.worker_id,
+                input_sub_graph_path=sub_graph_paths[meta_data.worker_id],
+                meta_data=meta_data
             )
-        f.close()
 
     def create_workers(self, graph_path, split_graph):
         """
@@ -188,6 +219,9 @@ class Master(Server):
         :return: Dictionary containing info about each worker
         """
         self.process_graph(graph_path, split_graph)
+        if self.shared_memory:
+            self.create_shared_run()
+
         self.worker_info_collection.start_workers(
             self.worker_script,
             self.hostname,
@@ -199,6 +233,17 @@ class Master(Server):
             self.walking_iterations
         )
 
+    def create_shared_run(self):
+        """
+        Writes the sub graph of every worker into shared memory, the workers attach to it instead of receiving it
+        """
+
+        self.shared_run = SharedRun(f'scaler-{uuid4().hex[:8]}', len(self.worker_info_collection))
+        self.shared_run.create({
+            worker_id: read_edges_as_array(worker_info.input_sub_graph_path)
+            for worker_id, worker_info in self.worker_info_collection.items()
+        })
+
     @staticmethod
     def random_temp_file(prefix: str):
         return f'/tmp/{prefix}-{str(uuid4())}.txt'
@@ -216,6 +261,10 @@ class Master(Server):
         self.handle_queue()
         self.worker_info_collection.terminate_workers()
 
+        if self.shared_run is not None:
+            self.shared_run.close()
+            self.shared_run = None
+
     def handle_alive(self, worker_id):
         """
         Updates the last-alive value of the worker
@@ -225,17 +274,21 @@ class Master(Server):
 
         self.worker_info_collection[worker_id].last_alive = time()
 
-    def handle_register(self, worker_id, host, port):
+    def handle_register(self, worker_id, host, port, socket_path, compression):
         """
         Handles the registration of a worker
 
         :param worker_id: Id of worker
         :param host: Host of worker
         :param port: Port of worker
+        :param socket_path: Unix domain socket of worker, None if it only listens on TCP
+        :param compression: Compression of file chunks the worker accepts, the agreed one is sent back in META_DATA
         """
 
         self.worker_info_collection[worker_id].meta_data.set_connection_info(
-            host, port)
+            host, port, socket_path)
+        self.worker_info_collection[worker_id].meta_data.compression = agree_on_compression(compression)
+        sockets.register_unix_socket(host, port, socket_path)
         self.handle_alive(worker_id)
         self.debug(f"Registered worker {worker_id} on {host}:{port}")
 
@@ -266,51 +319,114 @@ class Master(Server):
         )
 
     def handle_missing_chunk(self, worker_id, file_type, index):
-        self.worker_info_collection[worker_id].file_senders[file_type].index = index
+        if self.worker_info_collection[worker_id].file_senders[file_type] is not None:
+            self.worker_info_collection[worker_id].file_senders[file_type].handle_missing_chunk(index)
 
-    def handle_received_file(self, worker_id, file_type):
+    def handle_chunk_ack(self, worker_id, file_type, index, received_indices):
         if self.worker_info_collection[worker_id].file_senders[file_type] is not None:
+            self.worker_info_collection[worker_id].file_senders[file_type].handle_chunk_ack(index, received_indices)
+
+    def handle_received_file(self, worker_id, file_type):
+        if self.shared_run is not None and file_type == message.GRAPH:
+            self.worker_info_collection[worker_id].attached = True
+        elif self.worker_info_collection[worker_id].file_senders[file_type] is not None:
             self.worker_info_collection[worker_id].file_senders[file_type].target_received_file = True
 
-    def send_data_to_worker(self, worker_id: int, data: list, file_type: int):
-        self.worker_info_collection[worker_id].file_senders[file_type] = FileSender(
-            worker_id, file_type, data)
-        file_sender = self.worker_info_collection[worker_id].file_senders[file_type]
+    def send_files_to_workers(self, files: list):
+        """
+        Sends files to workers, all at the same time
 
-        self.send_message_to_worker(worker_id, message.write_start_send_file(
-            worker_id, file_type, len(file_sender.messages)))
-        while not file_sender.target_received_file or not file_sender.complete_file_send:
-            if file_sender.complete_file_send:
-                self.send_message_to_worker(
-                    worker_id, message.write_end_send_file(worker_id, file_type))
-                sleep(0.1)
-            else:
-                self.send_message_to_worker(
-                    worker_id, file_sender.get_next_message())
+        :param files: List of tuples of the worker id, the file type, the lines of the file and the hash of its
+            edges, empty if it should not be cached
+        """
+
+        transfers = []
+        for worker_id, file_type, data, content_hash in files:
+            # A backup only grows, so a restarted worker that kept the chunks of the previous backup of its
+            # predecessor only needs the rest
+            file_sender = FileSender(worker_id, file_type, data,
+                                     self.worker_info_collection[worker_id].meta_data.compression, content_hash,
+                                     file_transfer.edge_format, f'{self.run_id}-{file_type}-{worker_id}')
+            self.worker_info_collection[worker_id].file_senders[file_type] = file_sender
+            transfers.append((
+                lambda chunk_message, worker_id=worker_id: self.send_message_to_worker(worker_id, chunk_message),
+                file_sender
+            ))
+
+        send_files(self, transfers, report_progress=self.print_transfer_progress)
+
+        for worker_id, file_type, _, _ in files:
+            self.worker_info_collection[worker_id].file_senders[file_type] = None
+
+    def send_files_in_bulk(self, files: list):
+        """
+        Lets workers download files from the file server of the master, all at the same time. Workers that fail
+        to download a file receive it in chunks instead.
+
+        :param files: List of tuples of the worker id, the file type and the path of the file
+        """
+
+        if self.file_server is None:
+            self.file_server = FileServer()
+
+        bulk_files = []
+        for worker_id, file_type, path in files:
+            bulk_file = BulkFile(worker_id, file_type, path,
+                                 self.worker_info_collection[worker_id].meta_data.content_hash)
+            self.worker_info_collection[worker_id].file_senders[file_type] = bulk_file
+            self.file_server.register(bulk_file)
+            bulk_files.append(bulk_file)
+
+            self.send_message_to_worker(worker_id, message.write_bulk_file(
+                worker_id, file_type, bulk_file.file_id, bulk_file.size, bulk_file.content_hash,
+                self.file_server.hostname, self.file_server.port, self.file_server.socket_path))
+
+        self.wait_for_messages(lambda: all(bulk_file.confirmed or bulk_file.failed for bulk_file in bulk_files))
 
-            self.handle_queue()
+        for bulk_file in bulk_files:
+            self.file_server.unregister(bulk_file)
+            self.worker_info_collection[bulk_file.worker_id].file_senders[bulk_file.file_type] = None
 
-        self.worker_info_collection[worker_id].file_senders[file_type] = None
+        self.send_files_to_workers([
+            (bulk_file.worker_id, bulk_file.file_type, read_lines(bulk_file.path),
+             self.get_content_hash(bulk_file.worker_id))
+            for bulk_file in bulk_files if bulk_file.failed
+        ])
 
-    def handle_start_send_file(self, worker_id, file_type, number_of_chunks):
-        self.worker_info_collection[worker_id].file_receivers[file_type] = FileReceiver(
-            number_of_chunks)
+    def print_transfer_progress(self, file_senders: [FileSender]):
+        for file_sender in file_senders:
+            file_type = 'graph' if file_sender.file_type == message.GRAPH else 'backup'
+            megabytes = file_sender.bytes_acknowledged / 1024 / 1024
+            self.debug(f'Sending {file_type} to worker {file_sender.worker_id}: {megabytes:0.1f} MB received, '
+                       f'{megabytes / (time() - file_sender.started_at):0.1f} MB/s')
+
+    def handle_start_send_file(self, worker_id, file_type, transfer_id, content_hash, resume):
+        file_receiver = FileReceiver(transfer_id=transfer_id)
+        self.worker_info_collection[worker_id].file_receivers[file_type] = file_receiver
+
+        self.send_message_to_worker(worker_id, message.write_resume_file(
+            worker_id, file_type, transfer_id, file_receiver.expected_chunk_index, file_receiver.digest.hexdigest()))
+
+    def handle_resume_file(self, worker_id, file_type, transfer_id, index, digest):
+        file_sender = self.worker_info_collection[worker_id].file_senders[file_type]
+
+        # Sub graphs that are sent in bulk do not resume
+        if isinstance(file_sender, FileSender) and file_sender.transfer_id == transfer_id:
+            file_sender.handle_resume_file(index, digest)
 
     def handle_file_chunk(self, worker_id, file_type, index, chunk):
-        if self.worker_info_collection[worker_id].file_receivers[file_type] is None:
+        file_receiver = self.worker_info_collection[worker_id].file_receivers[file_type]
+        if file_receiver is None:
             return
 
-        try:
-            self.worker_info_collection[worker_id].file_receivers[file_type].receive_chunk(
-                index, chunk)
-        except UnexpectedChunkIndex as e:
-            self.send_message_to_worker(worker_id, message.write_missing_chunk(
-                worker_id, file_type, e.expected_index))
+        file_receiver.receive_chunk(index, chunk)
+        self.send_message_to_worker(worker_id, message.write_chunk_ack(
+            worker_id, file_type, file_receiver.expected_chunk_index, file_receiver.get_buffered_indices()))
 
-    def handle_end_send_file(self, worker_id, file_type):
+    def handle_end_send_file(self, worker_id, file_type, number_of_chunks):
         try:
             self.worker_info_collection[worker_id].file_receivers[file_type].handle_end_send_file(
-            )
+                number_of_chunks)
             self.send_message_to_worker(
                 worker_id, message.write_received_file(worker_id, file_type))
 
@@ -348,6 +464,11 @@ class Master(Server):
         ]), allow_connection_refused)
 
     def total_progress(self):
+        if self.shared_run is not None:
+            # Workers count their progress in shared memory instead of sending it
+            for worker_id, worker_info in self.worker_info_collection.items():
+                worker_info.progress = int(self.shared_run.progress.array[worker_id])
+
         return self.worker_info_collection.get_progress()
 
     def total_edges_received(self):
@@ -360,27 +481,24 @@ class Master(Server):
         stdout.flush()
 
     def wait_for_workers_to_complete(self):
-        while not self.worker_info_collection.all_workers_done():
-            sleep(0.01)
-            self.handle_queue()
+        self.wait_for_messages(self.worker_info_collection.all_workers_done)
 
     def create_graph(self):
         graph = DistributedGraph(distributed=False)
         for worker_info in self.worker_info_collection.values():
-            graph.load_from_list(worker_info.backup)
+            if self.vertex_labels is None:
+                graph.load_from_list(worker_info.backup)
+            else:
+                graph.load_from_list(partitioning.restore_labels(worker_info.backup, self.vertex_labels))
 
         return graph
 
     def wait_for_random_walker_counts(self, expected_number: int):
-        while self.random_walker_counts_received < expected_number:
-            self.handle_queue()
-            sleep(0.01)
+        self.wait_for_messages(lambda: self.random_walker_counts_received >= expected_number)
         self.random_walker_counts_received = 0
 
     def wait_for_worker_to_register(self, worker_id):
-        while not self.worker_info_collection[worker_id].is_registered():
-            self.handle_queue()
-            sleep(0.01)
+        self.wait_for_messages(self.worker_info_collection[worker_id].is_registered)
 
     def pause_workers(self):
         self.broadcast(message.write_worker_failed(),
@@ -404,10 +522,13 @@ class Master(Server):
 
         self.debug("\n\n")
         print("ERROR: A WORKER CRASHED")
+        self.debug(f"Queue depths: {self.get_queue_depths()}")
 
         # Update connection info
         for worker_id in failed_workers:
             self.debug(f"Worker {worker_id} died")
+            sockets.close_connection(
+                *self.worker_info_collection[worker_id].meta_data.get_connection_info())
             self.worker_info_collection[worker_id].meta_data.set_connection_info(
                 None, None)
             self.worker_info_collection[worker_id].file_senders[message.GRAPH] = None
@@ -427,6 +548,13 @@ class Master(Server):
         random_walkers_to_restart = len(
             self.worker_info_collection) * self.random_walkers_per_worker - self.worker_info_collection.random_walker_count()
 
+        # Random walkers on their way to a failed worker are restarted, while the other workers are paused they do
+        # not push any
+        if self.shared_run is not None:
+            for worker_id in failed_workers:
+                for ring in self.shared_run.get_incoming_rings(worker_id):
+                    ring.clear()
+
         for worker_id in failed_workers:
             self.debug(f"Restarting worker {worker_id}")
 
@@ -457,14 +585,17 @@ class Master(Server):
         self.debug(f"Sending updated meta-data to workers")
         self.send_meta_data_to_workers(allow_connection_refused=True)
 
-        for worker_id in failed_workers:
-            self.send_graph_to_worker(worker_id)
+        self.send_graphs_to_workers(failed_workers)
 
-        for worker_id in failed_workers:
-            if len(self.worker_info_collection[worker_id].backup) > 0:
-                self.send_data_to_worker(
-                    worker_id, self.worker_info_collection[worker_id].backup[:], message.BACKUP)
-                self.debug(f'Worker {worker_id} received backup')
+        workers_with_backup = [
+            worker_id for worker_id in failed_workers if len(self.worker_info_collection[worker_id].backup) > 0
+        ]
+        self.send_files_to_workers([
+            (worker_id, message.BACKUP, self.worker_info_collection[worker_id].backup, '')
+            for worker_id in workers_with_backup
+        ])
+        for worker_id in workers_with_backup:
+            self.debug(f'Worker {worker_id} received backup')
 
         self.continue_workers()
         self.debug(f"Restart successful\n")
@@ -479,8 +610,7 @@ class Master(Server):
 
         if self.method == "random_walk":
             while self.total_progress() < self.goal_size:
-                sleep(0.01)
-                self.handle_queue()
+                self.wait_for_messages(timeout=CONTROL_INTERVAL)
 
                 if self.show_debug_messages:
                     self.print_progress()
@@ -1,4 +1,3 @@
-from time import sleep
 import os
 
 from lab.master.Master import Master
@@ -14,9 +13,7 @@ class Upscaler(Master):
         os.system(f'mkdir -p {OUTPUT_DIR}')
         # self.broadcast(message.write_continue())
         while self.total_progress() < self.goal_size:
-            # for i in range(100):
-            sleep(0.01)
-            self.handle_queue()
+            self.wait_for_messages()
             self.print_progress()
         print("\nJob complete")
 
@@ -1,12 +1,16 @@
 from multiprocessing import Process
 from time import sleep
 
+import numpy as np
+
 from lab.util import sockets, message
 from lab.util.meta_data import MetaData, CombinedMetaData
 from lab.util.server import Server
 from lab.util import message, file_io, validation
+from lab.util import file_transfer, partition_cache, bulk_transfer
 from lab.util.file_transfer import FileReceiver, UnexpectedChunkIndex, FileSender
 from lab.util.meta_data import CombinedMetaData, MetaData
+from lab.util.shared_memory import SharedRun
 from typing import Dict
 
 
@@ -20,6 +24,9 @@ class Client:
         self.master_host = master_host
         self.master_port = master_port
 
+        # The master listens on a Unix domain socket in the same directory
+        sockets.register_unix_socket(master_host, master_port, sockets.get_unix_socket_path(master_port))
+
     def send_message_to_master(self, message_to_send: bytes):
         """
         Sends a message to the master
@@ -74,6 +81,8 @@ class WorkerInterface(Client, Server):
         self.re_init()  # init Server
 
         self.cancel = False
+        self.shared_run = None
+        self.partition_cache = partition_cache.get_cache()
 
         # Register self at master
         self.register()
@@ -94,6 +103,10 @@ class WorkerInterface(Client, Server):
         raise NotImplementedError()
 
     def send_progress_message(self, count):
+        if self.shared_run is not None:
+            self.shared_run.progress.array[self.worker_id] = count
+            return
+
         self.send_message_to_master(
             message.write_progress(self.worker_id, count))
 
@@ -101,6 +114,8 @@ class WorkerInterface(Client, Server):
         self.cancel = True
 
     def handle_terminate(self):
+        # The run is over, no worker takes over after this one
+        self.remove_journals()
         self.heartbeat_daemon.terminate()
         self.server.terminate()
 
@@ -112,73 +127,154 @@ class WorkerInterface(Client, Server):
                 min_vertex=meta_data['min_vertex'],
                 max_vertex=meta_data['max_vertex'],
                 host=meta_data['host'],
-                port=meta_data['port']
+                port=meta_data['port'],
+                socket_path=meta_data['socket_path'],
+                compression=meta_data['compression']
             )
             for meta_data in all_meta_data
         ])
 
+        for meta_data in all_meta_data:
+            sockets.register_unix_socket(meta_data['host'], meta_data['port'], meta_data['socket_path'])
+
     def receive_meta_data(self) -> CombinedMetaData:
         status, all_meta_data = self.get_message_from_queue()
+        self.handle_meta_data(all_meta_data)
 
-        return CombinedMetaData([
-            MetaData(
-                worker_id=meta_data['worker_id'],
-                number_of_edges=meta_data['number_of_edges'],
-                min_vertex=meta_data['min_vertex'],
-                max_vertex=meta_data['max_vertex'],
-                host=meta_data['host'],
-                port=meta_data['port']
-            )
-            for meta_data in all_meta_data
-        ])
+        return self.combined_meta_data
 
-    def handle_start_send_file(self, worker_id, file_type, number_of_chunks):
-        self.file_receivers[file_type] = FileReceiver(number_of_chunks)
+    def create_file_receiver(self, file_type, content_hash, transfer_id='') -> FileReceiver:
+        """
+        Creates the receiver of a file, which is complete right away if the file is in the partition cache
+        """
 
-    def handle_file_chunk(self, worker_id, file_type, index, chunk):
+        # The graph is only ever parsed as a whole, see get_graph_edges
+        file_receiver = FileReceiver(
+            spill_to_disk=file_type == message.GRAPH, content_hash=content_hash, transfer_id=transfer_id)
+        self.file_receivers[file_type] = file_receiver
+
+        if file_type == message.GRAPH and self.partition_cache is not None:
+            cached_path = self.partition_cache.get(content_hash)
+
+            if cached_path is not None:
+                file_receiver.load_cached(cached_path)
+                self.send_message_to_master(
+                    message.write_received_file(self.worker_id, file_type))
+
+        return file_receiver
+
+    def handle_start_send_file(self, worker_id, file_type, transfer_id, content_hash, resume):
+        file_receiver = self.create_file_receiver(file_type, content_hash, transfer_id)
+        if file_receiver.cached:
+            return
+
+        # The backup is sent again after every crash of this worker, the next worker continues where this one got
+        if file_type == message.BACKUP:
+            file_receiver.open_journal(resume)
+
+        self.send_message_to_master(message.write_resume_file(
+            self.worker_id, file_type, transfer_id, file_receiver.expected_chunk_index,
+            file_receiver.digest.hexdigest()))
+
+    def handle_resume_file(self, worker_id, file_type, transfer_id, index, digest):
+        if self.backup_sender is not None and self.backup_sender.transfer_id == transfer_id:
+            self.backup_sender.handle_resume_file(index, digest)
+
+    def handle_bulk_file(self, worker_id, file_type, file_id, size, content_hash, host, port, socket_path):
+        file_receiver = self.create_file_receiver(file_type, content_hash)
+        if file_receiver.cached:
+            return
+
+        # Written straight to the spill file, see get_graph_edges
+        sockets.register_unix_socket(host, port, socket_path)
         try:
-            self.file_receivers[file_type].receive_chunk(index, chunk)
-        except UnexpectedChunkIndex as e:
-            self.send_message_to_master(message.write_missing_chunk(
-                self.worker_id, file_type, e.expected_index))
+            bulk_transfer.receive(host, port, file_id, size, content_hash, file_receiver.spill_file)
+        except (OSError, bulk_transfer.CorruptTransfer):
+            # The master sends the file in chunks instead
+            self.send_message_to_master(message.write_missing_chunk(self.worker_id, file_type, 0))
+            return
 
-    def handle_end_send_file(self, worker_id, file_type):
+        file_receiver.verified = True
+        file_receiver.handle_end_send_file(0)
+        self.send_message_to_master(message.write_received_file(self.worker_id, file_type))
+
+    def handle_file_chunk(self, worker_id, file_type, index, chunk):
+        self.file_receivers[file_type].receive_chunk(index, chunk)
+        self.send_message_to_master(message.write_chunk_ack(
+            self.worker_id, file_type, self.file_receivers[file_type].expected_chunk_index,
+            self.file_receivers[file_type].get_buffered_indices()))
+
+    def handle_end_send_file(self, worker_id, file_type, number_of_chunks):
         try:
-            self.file_receivers[file_type].handle_end_send_file()
+            self.file_receivers[file_type].handle_end_send_file(number_of_chunks)
             self.send_message_to_master(
                 message.write_received_file(self.worker_id, file_type))
         except UnexpectedChunkIndex as e:
             self.send_message_to_master(message.write_missing_chunk(
                 self.worker_id, file_type, e.expected_index))
+            return
+
+    def cache_graph(self, edges: np.ndarray):
+        """
+        Stores the received graph in the partition cache, if it is the graph the master announced
+
+        :param edges: Received graph
+        """
+
+        file_receiver = self.file_receivers[message.GRAPH]
+        if self.partition_cache is None or file_receiver.cached \
+                or not (file_receiver.verified or file_receiver.content_hash == file_io.get_edges_hash(edges)):
+            return
+
+        self.partition_cache.put(file_receiver.content_hash, edges)
+        file_receiver.cached = True
 
     def handle_missing_chunk(self, worker_id, file_type, index):
-        self.backup_sender.index = index
+        if self.backup_sender is not None:
+            self.backup_sender.handle_missing_chunk(index)
+
+    def handle_chunk_ack(self, worker_id, file_type, index, received_indices):
+        if self.backup_sender is not None:
+            self.backup_sender.handle_chunk_ack(index, received_indices)
 
     def handle_received_file(self, worker_id, file_type):
         self.backup_sender.target_received_file = True
 
     def send_backup_to_master(self, data: list):
         self.backup_sender = FileSender(
-            self.worker_id, message.BACKUP, data=data)
-
-        self.send_message_to_master(message.write_start_send_file(
-            self.worker_id, message.BACKUP, len(self.backup_sender.messages)))
-        while not self.backup_sender.target_received_file or not self.backup_sender.complete_file_send:
-            if self.backup_sender.complete_file_send:
-                self.send_message_to_master(
-                    message.write_end_send_file(self.worker_id, message.BACKUP))
-                sleep(0.1)
-            else:
-                self.send_message_to_master(
-                    self.backup_sender.get_next_message())
+            self.worker_id, message.BACKUP, data=data,
+            compression=self.combined_meta_data[self.worker_id].compression, edge_format=file_transfer.edge_format)
 
-            self.handle_queue()
+        file_transfer.send_file(self, self.send_message_to_master, self.backup_sender)
 
         self.backup_sender = None
 
+    def handle_shared_memory(self, worker_id, prefix, number_of_workers, number_of_edges):
+        self.shared_run = SharedRun(prefix, number_of_workers)
+        self.shared_run.attach(self.worker_id, number_of_edges)
+
+        # The master continues the other workers once this worker has attached
+        self.send_message_to_master(message.write_received_file(self.worker_id, message.GRAPH))
+
     def receive_graph(self):
-        while self.file_receivers[message.GRAPH] is None or not self.file_receivers[message.GRAPH].received_complete_file:
-            self.handle_queue()
+        self.wait_for_messages(lambda: self.shared_run is not None or (
+            self.file_receivers[message.GRAPH] is not None
+            and self.file_receivers[message.GRAPH].received_complete_file))
+
+    def get_graph_edges(self) -> np.ndarray:
+        """
+        Call once, after receive_graph
+
+        :return: Array of the received sub graph, of shape (number of edges, 2)
+        """
+
+        if self.shared_run is not None:
+            return self.shared_run.graphs[self.worker_id].array
+
+        edges = self.file_receivers[message.GRAPH].read_edges()
+        self.cache_graph(edges)
+
+        return edges
 
     def register(self):
         """
@@ -188,16 +284,26 @@ class WorkerInterface(Client, Server):
         self.send_message_to_master(message.write_register(
             self.worker_id,
             self.hostname,
-            self.port
+            self.port,
+            self.socket_path,
+            file_transfer.compression
         ))
 
     def send_job_complete(self):
         """ Sends a JOB_COMPLETE to master
         """
 
+        # No worker takes over after this one anymore
+        self.remove_journals()
+
         self.send_message_to_master(
             message.write_job(message.JOB_COMPLETE, self.worker_id))
 
+    def remove_journals(self):
+        for file_receiver in self.file_receivers.values():
+            if file_receiver is not None:
+                file_receiver.remove_journal()
+
     def send_debug_message(self, debug_message: str):
         self.send_message_to_master(message.write_debug(
             self.worker_id,
@@ -1,6 +1,15 @@
 from lab.util.argument_parser import get_arg
 from lab.util.output import print_error
-from lab.util.validation import assert_bool,  assert_path, assert_file, assert_pos_float, assert_master_type, assert_method, assert_list, assert_positive_int
+from lab.util.validation import assert_bool,  assert_path, assert_file, assert_pos_float, assert_master_type, assert_method, assert_list, assert_positive_int, \
+    assert_message_codec, assert_server_mode, assert_compression, assert_nonnegative_int, assert_cache_dir, \
+    assert_edge_format, assert_partition_engine, assert_partition_strategy
+from lab.util import message, server, sockets, file_transfer, partition_cache, bulk_transfer, partitioning
+from shutil import rmtree
+from tempfile import mkdtemp
+
+# You should create this file yourself in order to run the program using ssh
+# By default, let local = 0
+from lab.util.ssh_connection_info import local
 
 
 def main():
@@ -26,6 +35,27 @@ def main():
         random_walkers_per_worker = get_arg(
             "--random-walkers-per-worker", assert_positive_int, default=1)
         debug = get_arg("--debug", assert_bool, default=True)
+        message_codec = get_arg(
+            "--message-codec", assert_message_codec, default='binary')
+        server_mode = get_arg(
+            "--server-mode", assert_server_mode, default='process')
+        shared_memory = get_arg("--shared-memory", assert_bool, default=False)
+        compression = get_arg(
+            "--compression", assert_compression, default='zlib')
+        edge_format = get_arg(
+            "--edge-format", assert_edge_format, default='binary')
+        bulk_transfer_enabled = get_arg("--bulk-transfer", assert_bool, default=True)
+        bandwidth = get_arg(
+            "--bandwidth", assert_nonnegative_int, default='0')
+        cache_dir = get_arg("--cache-dir", assert_cache_dir, default='')
+        cache_size = get_arg(
+            "--cache-size", assert_nonnegative_int, default='1024')
+        partition_engine = get_arg(
+            "--partition-engine", assert_partition_engine, default='stream')
+        partition_processes = get_arg(
+            "--partition-processes", assert_nonnegative_int, default='0')
+        partition_strategy = get_arg(
+            "--partition-strategy", assert_partition_strategy, default='ranges')
     except AssertionError as e:
         print_error(e)
         print_error(
@@ -40,15 +70,56 @@ def main():
             "\t--random-walkers-per-worker: The number of random walker to start per worker\n"
             "\t--backup-size: Minimum size of the backup before it will be send to the master during a run\n"
             "\t--walking-iterations: The number of steps a random walker sets before the queue will be handled\n"
-            "\t--debug: Show debug messages"
+            "\t--debug: Show debug messages\n"
+            "\t--message-codec: Encoding of the messages, `binary` or `json` (for debugging)\n"
+            "\t--server-mode: How messages are received, `process` (default) or `asyncio`\n"
+            "\t--shared-memory: Share the sub graphs, random walkers and progress through shared memory, requires local = 1\n"
+            "\t--compression: Compression of graph and backup transfers, `zlib` or `none`\n"
+            "\t--edge-format: How graph and backup transfers send edges, `binary` or `text`\n"
+            "\t--bulk-transfer: Let the workers download their sub graph with sendfile over a separate connection instead of sending it in chunks\n"
+            "\t--bandwidth: Maximum rate at which the master sends graphs and backups to all workers together, in MB/s, 0 for no limit\n"
+            "\t--cache-dir: Directory in which the workers cache their sub graphs, empty for `scaler-cache` in the temporary directory of their host\n"
+            "\t--cache-size: Maximum size of the sub graph cache of a worker host in MB, 0 to not cache\n"
+            "\t--partition-engine: How the graph is split, `stream`, `numpy` (for graphs that fit in memory) or `parallel` (on all cores)\n"
+            "\t--partition-processes: Number of processes of the parallel partition engine, 0 for one per core\n"
+            "\t--partition-strategy: Which vertices go to which worker, `ranges` of consecutive vertices or `greedy` to cut as few edges as possible"
         )
         return
 
-    # by default, start lab.master.Master.Master
-    master_func(worker_hostnames, graph_path, worker_script,
-                split_graph, output_file, scale, method,
-                random_walkers_per_worker, backup_size,
-                walking_iterations, debug)
+    if shared_memory and not local:
+        print_error("--shared-memory requires all nodes to run on this host, set local = 1 in ssh_connection_info.py")
+        return
+
+    # nested import to "avoid" circular dependency
+    from lab.master.Upscaler import Upscaler
+
+    if partition_strategy == 'greedy' and issubclass(master_func, Upscaler):
+        print_error("--partition-strategy greedy numbers the vertices again, which the Upscaler does not undo")
+        return
+
+    message.set_codec(message_codec)
+    server.set_mode(server_mode)
+    file_transfer.set_compression(compression)
+    file_transfer.set_edge_format(edge_format)
+    bulk_transfer.set_enabled(bulk_transfer_enabled)
+    file_transfer.set_bandwidth(bandwidth * 1024 * 1024)
+    partition_cache.set_cache(cache_dir, cache_size * 1024 * 1024)
+    partitioning.set_engine(partition_engine, partition_processes)
+    partitioning.set_strategy(partition_strategy)
+
+    if local:
+        # All nodes run on this host, so they can talk over Unix domain sockets
+        sockets.set_socket_dir(mkdtemp(prefix='scaler-'))
+
+    try:
+        # by default, start lab.master.Master.Master
+        master_func(worker_hostnames, graph_path, worker_script,
+                    split_graph, output_file, scale, method,
+                    random_walkers_per_worker, backup_size,
+                    walking_iterations, debug, shared_memory)
+    finally:
+        if sockets.socket_dir is not None:
+            rmtree(sockets.socket_dir, ignore_errors=True)
 
 
 if __name__ == '__main__':
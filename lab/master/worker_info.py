@@ -3,9 +3,9 @@ from typing import Dict
 from lab.util.file_transfer import FileSender, FileReceiver
 from lab.util.meta_data import MetaData, CombinedMetaData
 from time import time
-from lab.util.file_io import get_number_of_lines, get_first_line, get_last_line, get_start_vertex, sort_file
+from lab.util.file_io import get_number_of_lines, get_first_line, get_last_line, get_start_vertex
 from lab.util.command_line import setup_worker
-from lab.util import message
+from lab.util import message, server, sockets, file_transfer, partition_cache
 
 MAX_HEARTBEAT_DELAY = 1.0
 
@@ -22,6 +22,8 @@ class WorkerInfo:
         self.backup = []
         self.hostname = hostname
         self.progress = 0
+        # Whether the worker has attached to the shared memory of the run
+        self.attached = False
 
         self.file_senders: Dict[int, FileSender] = {
             message.GRAPH: None,
@@ -43,9 +45,6 @@ class WorkerInfo:
         self.meta_data.max_vertex = get_start_vertex(
             get_last_line(self.input_sub_graph_path))
 
-    def sort_sub_graph(self):
-        sort_file(self.input_sub_graph_path)
-
     def terminate(self):
         if self.process is not None:
             self.process.terminate()
@@ -56,6 +55,7 @@ class WorkerInfo:
     def start_worker(self, worker_script, hostname_master, port_master, scale, method, number_of_random_walkers=1, load_backup=0, backup_size=100, walking_iterations=1):
         self.meta_data.host = None
         self.meta_data.port = None
+        self.meta_data.socket_path = None
 
         self.process = setup_worker(
             self.hostname,
@@ -68,7 +68,14 @@ class WorkerInfo:
             load_backup,
             number_of_random_walkers,
             backup_size,
-            walking_iterations
+            walking_iterations,
+            message.codec.name,
+            server.mode,
+            sockets.socket_dir,
+            file_transfer.compression,
+            partition_cache.cache_dir,
+            partition_cache.cache_size // 1024 // 1024,
+            file_transfer.edge_format
         )
 
 
@@ -107,10 +114,6 @@ class WorkerInfoCollection:
         for worker_info in self.worker_info_collection.values():
             worker_info.update_meta_data()
 
-    def sort_sub_graphs(self):
-        for worker_info in self.worker_info_collection.values():
-            worker_info.sort_sub_graph()
-
     def terminate_workers(self):
         for worker_info in self.worker_info_collection.values():
             try:
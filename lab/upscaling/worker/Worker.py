@@ -1,5 +1,3 @@
-from time import sleep
-
 from lab.util.graph import Graph
 from lab.util import message
 from lab.master.WorkerInterface import WorkerInterface
@@ -26,11 +24,15 @@ class Worker(WorkerInterface):
             # message.WORKER_FAILED: self.handle_worker_failed,
             message.CONTINUE: self.handle_continue,
             message.START_SEND_FILE: self.handle_start_send_file,
+            message.RESUME_FILE: self.handle_resume_file,
+            message.BULK_FILE: self.handle_bulk_file,
             message.FILE_CHUNK: self.handle_file_chunk,
             message.END_SEND_FILE: self.handle_end_send_file,
             message.MISSING_CHUNK: self.handle_missing_chunk,
+            message.CHUNK_ACK: self.handle_chunk_ack,
             message.RECEIVED_FILE: self.handle_received_file,
-            message.TERMINATE: self.handle_terminate
+            message.TERMINATE: self.handle_terminate,
+            message.SHARED_MEMORY: self.handle_shared_memory
         }
         if not shared_filesystem:
             self.receive_graph()
@@ -49,7 +51,7 @@ class Worker(WorkerInterface):
         if shared_filesystem:
             graph.load_from_file(lab.util.ssh_connection_info.graph_path)
         else:
-            graph.load_from_list(self.file_receivers[message.GRAPH].file)
+            graph.addEdgeSet(self.get_graph_edges().tolist(), ignore_duplicates=True)
         algorithm = Algorithm.DegreeDistribution(graph)
 
         if self.method == 'Gscaler':
@@ -79,7 +81,6 @@ class Worker(WorkerInterface):
         self.send_job_complete()
 
         while True:
-            sleep(0.1)
-            self.handle_queue()
+            self.wait_for_messages()
 
         # self.terminate()
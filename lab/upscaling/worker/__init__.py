@@ -4,9 +4,16 @@ from lab.util.validation import (
     assert_host,
     assert_nonnegative_int,
     assert_positive_int,
-    assert_upscaling_method
+    assert_upscaling_method,
+    assert_message_codec,
+    assert_server_mode,
+    assert_socket_dir,
+    assert_compression,
+    assert_cache_dir,
+    assert_edge_format
 )
 from lab.upscaling.worker.Worker import Worker
+from lab.util import message, server, sockets, file_transfer, partition_cache
 
 
 def main():
@@ -19,6 +26,19 @@ def main():
         master_host = get_arg("--master-host", assert_host)
         master_port = get_arg("--master-port", assert_positive_int)
         method = get_arg("--method", assert_upscaling_method)
+        message_codec = get_arg(
+            "--message-codec", assert_message_codec, default='binary')
+        server_mode = get_arg(
+            "--server-mode", assert_server_mode, default='process')
+        socket_dir = get_arg(
+            "--socket-dir", assert_socket_dir, default='')
+        compression = get_arg(
+            "--compression", assert_compression, default='zlib')
+        edge_format = get_arg(
+            "--edge-format", assert_edge_format, default='binary')
+        cache_dir = get_arg("--cache-dir", assert_cache_dir, default='')
+        cache_size = get_arg(
+            "--cache-size", assert_nonnegative_int, default='0')
     except Exception as e:
         print_error(e)
         print_error(
@@ -27,9 +47,23 @@ def main():
             "\t--master-host: The host of the master\n"
             "\t--master-port: The port of the master\n"
             "\t--method: The method to use for upscaling, `Gscaler` or `DegreeDistribution`\n"
+            "\t--message-codec: Encoding of the messages, `binary` or `json` (for debugging)\n"
+            "\t--server-mode: How messages are received, `process` (default) or `asyncio`\n"
+            "\t--socket-dir: Directory for the Unix domain sockets of a single host run, empty to only use TCP\n"
+            "\t--compression: Compression of graph and backup transfers this worker accepts, `zlib` or `none`\n"
+            "\t--edge-format: How this worker sends edges in backups, `binary` or `text`\n"
+            "\t--cache-dir: Directory of the sub graph cache of this host, empty for the default\n"
+            "\t--cache-size: Maximum size of the sub graph cache of this host in MB, 0 to not cache\n"
         )
         return
 
+    message.set_codec(message_codec)
+    server.set_mode(server_mode)
+    sockets.set_socket_dir(socket_dir)
+    file_transfer.set_compression(compression)
+    file_transfer.set_edge_format(edge_format)
+    partition_cache.set_cache(cache_dir, cache_size * 1024 * 1024)
+
     Worker(worker_id, master_host, master_port, method)
 
 
@@ -0,0 +1,178 @@
+import hashlib
+import os
+from threading import Thread, Lock
+from time import sleep
+from typing import BinaryIO, Dict
+from uuid import uuid4
+
+from lab.util import sockets, file_transfer
+
+# Bytes read from the connection or the file at once
+BLOCK_SIZE = 1024 * 1024
+# Times a receiver connects again after a failed transfer
+ATTEMPTS = 3
+
+# Whether the master sends sub graphs in bulk with sendfile instead of in chunks
+enabled = True
+
+
+def set_enabled(value: bool):
+    global enabled
+    enabled = value
+
+
+class CorruptTransfer(Exception):
+    pass
+
+
+class BulkFile:
+    """ File the master offers on its FileServer, the receiver downloads it over a connection of its own and
+    confirms it with RECEIVED_FILE, or reports with MISSING_CHUNK that it could not. The hash of the file checks
+    the download and is the key of the file in a partition cache.
+    """
+
+    def __init__(self, worker_id: int, file_type: int, path: str, content_hash: str):
+        """
+        :param content_hash: SHA-256 hash of the file, see `file_io.get_file_hash`, taken when the file was written
+        """
+
+
+        self.worker_id = worker_id
+        self.file_type = file_type
+        self.path = path
+        self.file_id = uuid4().hex
+        self.size = os.path.getsize(path)
+        self.content_hash = content_hash
+        self.target_received_file = False
+        self.failed = False
+
+    @property
+    def confirmed(self):
+        return self.target_received_file
+
+    def handle_missing_chunk(self, index: int):
+        self.failed = True
+
+
+class FileServer:
+    """ Serves files to receivers that ask for them by id. The kernel copies a file straight from the page cache
+    to the connection with sendfile, so serving costs next to no CPU of this process.
+    """
+
+    def __init__(self):
+        self.files: Dict[str, str] = {}
+        self.lock = Lock()
+        # Shared by all connections, `bandwidth` holds for all transfers together
+        self.token_bucket = file_transfer.TokenBucket(file_transfer.bandwidth) \
+            if file_transfer.bandwidth > 0 else None
+
+        server_socket = sockets.bind("", 0)
+        self.hostname = sockets.get_hostname()
+        self.port = sockets.get_port(server_socket)
+        Thread(target=self.listen, args=(server_socket,), daemon=True).start()
+
+        self.socket_path = sockets.get_unix_socket_path(self.port)
+        if self.socket_path is not None:
+            Thread(target=self.listen, args=(sockets.bind_unix(self.socket_path),), daemon=True).start()
+
+    def register(self, bulk_file: BulkFile):
+        with self.lock:
+            self.files[bulk_file.file_id] = bulk_file.path
+
+    def unregister(self, bulk_file: BulkFile):
+        with self.lock:
+            self.files.pop(bulk_file.file_id, None)
+
+    def listen(self, server_socket):
+        while True:
+            client_socket, addr = server_socket.accept()
+            Thread(target=self.serve, args=(client_socket,), daemon=True).start()
+
+    def serve(self, client_socket):
+        try:
+            with client_socket.makefile('rb') as f:
+                file_id = sockets.read_frame(f)
+
+            with self.lock:
+                path = None if file_id is None else self.files.get(file_id.decode())
+
+            # The receiver notices an unknown file by the missing bytes
+            if path is not None:
+                with open(path, 'rb') as f:
+                    self.send(client_socket, f)
+        except (OSError, UnicodeDecodeError, sockets.FrameTooLarge):
+            pass
+        finally:
+            client_socket.close()
+
+    def send(self, client_socket, f: BinaryIO):
+        if self.token_bucket is None:
+            client_socket.sendfile(f)
+            return
+
+        offset = 0
+        while True:
+            sent = client_socket.sendfile(f, offset, BLOCK_SIZE)
+            if sent == 0:
+                return
+
+            offset += sent
+            with self.lock:
+                self.token_bucket.consume(sent)
+                delay = self.token_bucket.get_delay()
+            sleep(delay)
+
+
+def download(host, port, file_id: str, size: int, content_hash: str, file: BinaryIO):
+    """
+    Downloads a file from a FileServer
+
+    :param file_id: Id of the file
+    :param size: Length of the file in bytes
+    :param content_hash: SHA-256 hash of the file, see `file_io.get_file_hash`
+    :param file: File to write to, from its current position on
+    """
+
+    connection = sockets.connect(host, port)
+    buffer = bytearray(BLOCK_SIZE)
+    received = 0
+    digest = hashlib.sha256()
+
+    try:
+        connection.sendall(sockets.write_frame(file_id.encode()))
+
+        with memoryview(buffer) as view:
+            while received < size:
+                length = connection.recv_into(view, min(BLOCK_SIZE, size - received))
+                if length == 0:
+                    break
+
+                file.write(view[:length])
+                digest.update(view[:length])
+                received += length
+    finally:
+        connection.close()
+
+    if received != size or digest.hexdigest() != content_hash:
+        raise CorruptTransfer(f'Received {received} of {size} bytes with hash {digest.hexdigest()}, '
+                              f'expected {content_hash}')
+
+
+def receive(host, port, file_id: str, size: int, content_hash: str, file: BinaryIO):
+    """
+    Downloads a file from a FileServer, tries again if the transfer fails
+
+    :param file: Empty file to write to
+    """
+
+    for attempt in range(ATTEMPTS):
+        try:
+            file.seek(0)
+            file.truncate()
+            download(host, port, file_id, size, content_hash, file)
+            return
+        except (OSError, CorruptTransfer):
+            if attempt == ATTEMPTS - 1:
+                raise
+
+            sleep(0.01 * (attempt + 1))
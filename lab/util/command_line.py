@@ -22,7 +22,14 @@ def run_ssh_script(hostname, *arguments):
 
 def setup_worker(hostname_worker, script, worker_id, hostname_master,
                  port_master, scale, method, load_backup,
-                 number_of_random_walkers, backup_size, walking_iterations):
+                 number_of_random_walkers, backup_size, walking_iterations,
+                 message_codec='binary', server_mode='process', socket_dir=None,
+                 compression='zlib', cache_dir=None, cache_size=0, edge_format='binary'):
+    # Workers on other hosts cannot reach the Unix domain sockets
+    socket_arguments = [] if socket_dir is None else ['--socket-dir', socket_dir]
+    # Without a directory the workers use the default one of their host
+    cache_arguments = ['--cache-size', str(cache_size)] + ([] if cache_dir is None else ['--cache-dir', cache_dir])
+
     # Debug locally, without ssh
     if local:
         return run_python_script(
@@ -35,7 +42,13 @@ def setup_worker(hostname_worker, script, worker_id, hostname_master,
             '--load-backup', str(load_backup),
             '--n-random-walkers', str(number_of_random_walkers),
             '--backup-size', str(backup_size),
-            '--walking-iterations', str(walking_iterations)
+            '--walking-iterations', str(walking_iterations),
+            '--message-codec', message_codec,
+            '--server-mode', server_mode,
+            '--compression', compression,
+            '--edge-format', edge_format,
+            *socket_arguments,
+            *cache_arguments
         )
 
     return run_ssh_script(
@@ -49,5 +62,11 @@ def setup_worker(hostname_worker, script, worker_id, hostname_master,
         '--load-backup', str(load_backup),
         '--n-random-walkers', str(number_of_random_walkers),
         '--backup-size', str(backup_size),
-        '--walking-iterations', str(walking_iterations)
+        '--walking-iterations', str(walking_iterations),
+        '--message-codec', message_codec,
+        '--server-mode', server_mode,
+        '--compression', compression,
+        '--edge-format', edge_format,
+        *socket_arguments,
+        *cache_arguments
     )
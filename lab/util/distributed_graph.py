@@ -108,6 +108,17 @@ class DistributedGraph:
 
             vertex1.add_edge(Edge(vertex1, vertex2))
 
+    def load_from_array(self, edges):
+        """
+        :param edges: Array of shape (number of edges, 2), e.g. a partition in shared memory
+        """
+
+        for vertex1_label, vertex2_label in edges.tolist():
+            vertex1 = self.get_vertex(vertex1_label)
+            vertex2 = self.get_vertex(vertex2_label)
+
+            vertex1.add_edge(Edge(vertex1, vertex2))
+
     def load_from_file(self, filename='graph.txt'):
         with open(filename) as file:
             for line in file:
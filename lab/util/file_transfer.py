@@ -1,5 +1,114 @@
-from lab.util import message
+import hashlib
+import os
+import string
+import struct
+import zlib
+
+import numpy as np
+
+from lab.util import message, file_io
+from tempfile import TemporaryFile, gettempdir
 from time import time
+from typing import Dict, Iterable
+from uuid import uuid4
+
+# Seconds to wait for a confirmation before END_SEND_FILE is sent again
+END_SEND_FILE_TIMEOUT = 0.1
+# Number of chunks that may be sent before the first of them is acknowledged
+WINDOW_SIZE = 16
+# Seconds without any acknowledgement after which the chunks in flight are sent again
+RETRANSMIT_TIMEOUT = 5.0
+# Seconds between reports of the progress of transfers
+PROGRESS_INTERVAL = 1.0
+
+ZLIB = 'zlib'
+NO_COMPRESSION = 'none'
+# Smaller chunks are sent raw, compressing them gains too little
+COMPRESSION_THRESHOLD = 4096
+# Fastest level, edge lists already compress well with it
+COMPRESSION_LEVEL = 1
+
+# Compression of file chunks this node accepts, agreed upon per worker at REGISTER
+compression = ZLIB
+
+TEXT = 'text'
+BINARY = 'binary'
+# Bytes of an edge in a spilled file of binary chunks and in the partition cache, as a pair of little-endian int64
+EDGE_TYPE = message.EDGE_TYPES[message.INT64_EDGE_CHUNK]
+
+# Format in which this node sends edges, a node reads both
+edge_format = BINARY
+
+# Directory of the journals of the transfers received on this host, see `FileReceiver.open_journal`
+JOURNAL_DIR = os.path.join(gettempdir(), 'scaler-journals')
+# Seconds after its last write that a journal is left over from a run that was aborted or crashed
+JOURNAL_MAX_AGE = 24 * 60 * 60
+# Every chunk in a journal is preceded by its type and its length
+JOURNAL_RECORD = struct.Struct('!cI')
+TEXT_RECORD = b'T'
+EDGES_RECORD = b'E'
+
+# Bytes per second this node sends file chunks at, over all its transfers together, 0 for no limit
+bandwidth = 0
+
+
+def set_compression(name: str):
+    global compression
+    compression = name
+
+
+def set_bandwidth(bytes_per_second: float):
+    global bandwidth
+    bandwidth = bytes_per_second
+
+
+def set_edge_format(name: str):
+    global edge_format
+    edge_format = name
+
+
+def agree_on_compression(proposed_compression: str) -> str:
+    """
+    :param proposed_compression: Compression a peer accepts
+    :return: Compression both this node and the peer accept
+    """
+
+    return proposed_compression if proposed_compression == compression else NO_COMPRESSION
+
+
+def get_chunk_bytes(chunk: str or np.ndarray) -> bytes:
+    """
+    :param chunk: Text or array of edges
+    :return: Content of the chunk as it goes into the running digest of a transfer, whatever the compression
+    """
+
+    if isinstance(chunk, np.ndarray):
+        return chunk.astype(EDGE_TYPE, copy=False).tobytes()
+
+    return chunk.encode()
+
+
+def get_journal_path(transfer_id: str) -> str or None:
+    # Transfer ids are used as file names, so anything else could point outside the directory
+    if transfer_id == '' or not all(character in string.ascii_letters + string.digits + '-'
+                                    for character in transfer_id):
+        return None
+
+    return os.path.join(JOURNAL_DIR, f'{transfer_id}.journal')
+
+
+def remove_stale_journals():
+    """
+    Removes the journals that were not written to for JOURNAL_MAX_AGE, a transfer without its journal starts over
+    """
+
+    for entry in os.scandir(JOURNAL_DIR):
+        try:
+            if entry.name.endswith('.journal') and time() - entry.stat().st_mtime > JOURNAL_MAX_AGE:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            # Removed by another worker on this host
+            pass
 
 
 class UnexpectedChunkIndex(Exception):
@@ -12,64 +121,538 @@ class UnexpectedChunkIndex(Exception):
 
 
 class FileReceiver:
-    def __init__(self, expected_number_of_chunks: int):
+    """ Puts the chunks of a file back in order. Every chunk has been checked against its CRC-32 when it was
+    decoded, see `message.CHECKSUM_STATUSES`, the chunks in order go into a running digest that tells the sender
+    which data the receiver has when it resumes a transfer.
+    """
+
+    def __init__(self, spill_to_disk: bool = False, content_hash: str = '', transfer_id: str = ''):
+        """
+        :param spill_to_disk: Boolean whether to append the chunks as raw bytes to a temporary file instead of
+            keeping them as lines in `file`, read it with `read_edges`
+        :param content_hash: Hash the sender announced for the edges, empty if none
+        :param transfer_id: Id the sender announced for the transfer
+        """
+
         self.file = []
-        self.expected_number_of_chunks = expected_number_of_chunks
+        self.transfer_id = transfer_id
+        self.digest = hashlib.sha256()
+        self.journal = None
+        self.journal_length = 0
+        # Start of the record of the last chunk in the journal
+        self.last_record_at = 0
+        self.spill_file = TemporaryFile() if spill_to_disk else None
+        # Format of the spilled chunks, text until the first array of edges arrives
+        self.spill_format = TEXT
+        self.content_hash = content_hash
+        # Whether the content has been checked against the hash while it was received, see `lab.util.bulk_transfer`
+        self.verified = False
+        self.cached = False
+        # Known once the sender has read all of its data, at END_SEND_FILE
+        self.expected_number_of_chunks = None
         self.expected_chunk_index = 0
+        # Chunks that arrived before the chunks in front of them, by index
+        self.buffered_chunks = {}
         self.started_at = time()
 
     @property
     def received_complete_file(self):
-        return self.expected_chunk_index >= self.expected_number_of_chunks
+        return self.expected_number_of_chunks is not None \
+            and self.expected_chunk_index >= self.expected_number_of_chunks
+
+    def receive_chunk(self, index: int, chunk: str or np.ndarray):
+        if index < self.expected_chunk_index or index in self.buffered_chunks or self.received_complete_file:
+            # Retransmitted, the acknowledgement got lost or was late, or sent before the file was found in a cache
+            return
+
+        self.buffered_chunks[index] = chunk
+        while self.expected_chunk_index in self.buffered_chunks:
+            chunk = self.buffered_chunks.pop(self.expected_chunk_index)
+            data = self.append_chunk(chunk)
+
+            if self.journal is not None:
+                record = JOURNAL_RECORD.pack(EDGES_RECORD if isinstance(chunk, np.ndarray) else TEXT_RECORD,
+                                             len(data)) + data
+                self.journal.write(record)
+                self.journal.flush()
+                self.last_record_at = self.journal_length
+                self.journal_length += len(record)
 
-    def receive_chunk(self, index: int, chunk: str):
-        if index != self.expected_chunk_index:
-            raise UnexpectedChunkIndex(f'Unexpected chunk index: {index}, expected {self.expected_chunk_index}', self.expected_chunk_index)
+    def append_chunk(self, chunk: str or np.ndarray) -> bytes:
+        """
+        :param chunk: Next chunk in order
+        :return: Content of the chunk, see `get_chunk_bytes`
+        """
 
-        self.file += [line + '\n' for line in chunk.rstrip().split('\n')]
+        data = get_chunk_bytes(chunk)
+
+        if self.spill_file is not None:
+            if isinstance(chunk, np.ndarray):
+                # A sender sends all chunks of a file in the same format
+                self.spill_format = BINARY
+            self.spill_file.write(data)
+        elif isinstance(chunk, np.ndarray):
+            self.file += [f'{start_vertex} {end_vertex}\n' for start_vertex, end_vertex in chunk.tolist()]
+        else:
+            self.file += [line + '\n' for line in chunk.rstrip().split('\n')]
+
+        self.digest.update(data)
         self.expected_chunk_index += 1
 
-    def handle_end_send_file(self):
+        return data
+
+    def open_journal(self, resume: bool):
+        """
+        Keeps the chunks in a journal on disk, named after the transfer, so a receiver that takes over after a crash
+        can continue the transfer. Call before any chunk is received.
+
+        :param resume: Boolean whether to take over the chunks in the journal, otherwise it is emptied
+        """
+
+        path = get_journal_path(self.transfer_id)
+        if path is None:
+            return
+
+        os.makedirs(JOURNAL_DIR, exist_ok=True)
+        remove_stale_journals()
+        self.journal = open(path, 'a+b')
+        self.journal.seek(0)
+        length = 0
+
+        while resume:
+            header = self.journal.read(JOURNAL_RECORD.size)
+            if len(header) < JOURNAL_RECORD.size:
+                break
+
+            record_type, size = JOURNAL_RECORD.unpack(header)
+            data = self.journal.read(size)
+            if len(data) < size:
+                break
+
+            self.append_chunk(data.decode() if record_type == TEXT_RECORD
+                              else np.frombuffer(data, dtype=EDGE_TYPE).reshape(-1, 2))
+            self.last_record_at = length
+            length = self.journal.tell()
+
+        # Drops a record that was cut off by a crash
+        self.journal.truncate(length)
+        self.journal_length = length
+
+    def remove_journal(self):
+        if self.journal is None:
+            return
+
+        self.journal.close()
+        os.remove(self.journal.name)
+        self.journal = None
+
+    def load_cached(self, path: str):
+        """
+        Completes the file with a copy that was received before, instead of receiving it
+
+        :param path: Path of the copy, see `lab.util.partition_cache`
+        """
+
+        self.spill_file = open(path, 'rb')
+        self.spill_format = BINARY
+        self.expected_number_of_chunks = 0
+        self.cached = True
+
+    def read_edges(self) -> np.ndarray:
+        """
+        Reads the received file in a single pass and closes it, which removes it unless it came from a cache
+
+        :return: Array of shape (number of edges, 2)
+        """
+
+        self.spill_file.flush()
+        self.spill_file.seek(0)
+        if self.spill_format == BINARY:
+            edges = np.fromfile(self.spill_file, dtype=EDGE_TYPE).reshape(-1, 2)
+        else:
+            edges = file_io.read_edges_as_array(self.spill_file)
+
+        self.spill_file.close()
+        self.spill_file = None
+
+        return edges
+
+    def get_buffered_indices(self) -> [int]:
+        return sorted(self.buffered_chunks.keys())
+
+    def handle_end_send_file(self, number_of_chunks: int):
+        self.expected_number_of_chunks = number_of_chunks
+
         if not self.received_complete_file:
             raise UnexpectedChunkIndex('Missing chunk(s) at end send file', self.expected_chunk_index)
 
+        if self.journal is not None and self.journal_length > self.last_record_at:
+            # The last chunk is cut short by the end of the data, a later transfer of more data has more in it
+            self.journal.truncate(self.last_record_at)
+            self.journal.flush()
+            self.journal_length = self.last_record_at
+
 
 class FileSender:
-    def __init__(self, worker_id: int, file_type: int, data: list):
-        self.messages = self.create_messages(worker_id, data, file_type)
+    """ Keeps up to WINDOW_SIZE chunks in flight. The receiver acknowledges every chunk with the index of the first
+    chunk it misses and the chunks after it that it has buffered, a missing chunk is sent again as soon as a chunk
+    sent after it has been acknowledged, or after RETRANSMIT_TIMEOUT without any acknowledgement.
+
+    Chunks are cut from the data when the window has room for them and dropped once acknowledged, so a sender
+    that reads its data lazily, e.g. with `file_io.read_lines`, holds at most a window of it.
+
+    In the BINARY edge format the lines of every chunk are sent as an array of edges instead of text, the packed
+    edges are compressed like text.
+
+    No chunk is sent before the receiver has answered START_SEND_FILE with the number of chunks of the transfer
+    it already has, from the journal of an earlier receiver, and their digest. The sender skips those chunks if
+    its own chunks have the same digest, otherwise the receiver starts over.
+    """
+
+    def __init__(self, worker_id: int, file_type: int, data: Iterable[str], compression: str = NO_COMPRESSION,
+                 content_hash: str = '', edge_format: str = TEXT, transfer_id: str = None):
+        """
+        :param content_hash: Hash of the edges, see `file_io.get_edges_hash`, lets a receiver that already has them
+            confirm right away. Empty for data that is not cached.
+        :param edge_format: TEXT or BINARY, the data has to be lines of edges for BINARY
+        :param transfer_id: Id of the data, a later transfer of the same data, or of data that starts with it, may
+            use the same id to resume. None for a new id.
+        """
+
+        self.worker_id = worker_id
+        self.file_type = file_type
+        self.compression = compression
+        self.content_hash = content_hash
+        self.edge_format = edge_format
+        self.transfer_id = uuid4().hex if transfer_id is None else transfer_id
+        self.data = data
+        # Data that can only be read once, e.g. a generator, can not be read again when the receiver starts over
+        self.resume = iter(data) is not data
+        self.start_sent = False
+        self.resumed = False
+        self.restart()
         self.target_received_file = False
+        # All chunks before this index have been acknowledged
         self.index = 0
+        self.in_flight = set()
+        self.retransmissions = set()
+        # Order in which the chunks in flight were last sent
+        self.send_order = {}
+        self.number_sent = 0
+        self.bytes_acknowledged = 0
+        self.acknowledged_at = time()
+        self.end_sent_at = 0
         self.started_at = time()
 
+    def restart(self):
+        """
+        Reads the data from the start, before any chunk is sent
+        """
+
+        self.lines = iter(self.data)
+        # Line that did not fit in the previous chunk
+        self.next_line = None
+        # Chunks that have not been acknowledged yet, by index
+        self.chunks: Dict[int, bytes] = {}
+        # Known once all data has been read
+        self.number_of_chunks = None
+        self.next_index = 0
+        self.digest = hashlib.sha256()
+        # Running digest of the chunks before each index
+        self.digests = [self.digest.hexdigest()]
+
     @property
     def complete_file_send(self):
-        return self.index >= len(self.messages)
+        return self.number_of_chunks is not None and self.index >= self.number_of_chunks
+
+    @property
+    def confirmed(self):
+        # A receiver with a cached copy confirms before all chunks are sent
+        return self.target_received_file and (self.complete_file_send or self.content_hash != '')
+
+    def can_send_start(self) -> bool:
+        return not self.start_sent and not self.confirmed
+
+    def can_send(self) -> bool:
+        """
+        :return: Boolean whether there is a chunk to send before the next acknowledgement
+        """
+
+        if not self.resumed:
+            return False
+
+        if len(self.retransmissions) > 0 or time() - self.acknowledged_at >= RETRANSMIT_TIMEOUT:
+            return True
+
+        return len(self.in_flight) < WINDOW_SIZE and self.number_of_chunks is None
+
+    def can_send_end(self) -> bool:
+        """
+        :return: Boolean whether END_SEND_FILE should be sent (again) to ask for a confirmation
+        """
 
-    @staticmethod
-    def get_file_chunk(worker_id, file_type, index, data: list):
-        chunk = ''
-        lines = 0
+        return self.complete_file_send and not self.target_received_file \
+            and time() - self.end_sent_at >= END_SEND_FILE_TIMEOUT
 
-        for line in data:
-            if len(message.write_file_chunk(worker_id, file_type, index, chunk + line)) >= message.MAX_MESSAGE_SIZE:
+    def read_file_chunk(self, index: int) -> str:
+        """
+        Takes lines until the encoded message would reach MAX_MESSAGE_SIZE
+
+        :return: Chunk, empty when all lines have been read
+        """
+
+        chunk = []
+        # Size of the message without any content, every line adds its encoded length
+        size = len(message.write_file_chunk(self.worker_id, self.file_type, index, ''))
+        get_encoded_length = message.codec.get_encoded_length
+
+        if self.edge_format == BINARY:
+            # At most a pair of int64, whatever the length of the line
+            edge_length = message.codec.get_encoded_bytes_length(2 * EDGE_TYPE.itemsize)
+            get_encoded_length = lambda line: edge_length
+
+        if self.next_line is not None:
+            chunk.append(self.next_line)
+            size += get_encoded_length(self.next_line)
+            self.next_line = None
+
+        for line in self.lines:
+            size += get_encoded_length(line)
+            if size >= message.MAX_MESSAGE_SIZE and len(chunk) > 0:
+                self.next_line = line
                 break
 
-            chunk += line
-            lines += 1
+            chunk.append(line)
+
+        return ''.join(chunk)
+
+    def read_next_chunk(self) -> str or np.ndarray or None:
+        """
+        :return: Next chunk, text or an array of edges in the BINARY edge format, None when all lines have been read
+        """
+
+        chunk = self.read_file_chunk(self.next_index)
+        if len(chunk) == 0:
+            return None
+
+        if self.edge_format == BINARY:
+            chunk = file_io.parse_edges(chunk)
+
+        self.digest.update(get_chunk_bytes(chunk))
+        self.digests.append(self.digest.hexdigest())
+        self.next_index += 1
+
+        return chunk
+
+    def read_next_message(self) -> bytes or None:
+        """
+        :return: Message with the next chunk, None when all lines have been read
+        """
+
+        chunk = self.read_next_chunk()
+        if chunk is None:
+            return None
+
+        return self.write_file_chunk(self.worker_id, self.file_type, self.next_index - 1, chunk)
+
+    def write_file_chunk(self, worker_id, file_type, index, chunk: str or np.ndarray) -> bytes:
+        if isinstance(chunk, np.ndarray):
+            # At least the size of the packed edges, they are packed as int32 when the vertices fit
+            compress = self.compression == ZLIB and chunk.size * 4 >= COMPRESSION_THRESHOLD
+
+            return message.write_edge_chunk(worker_id, file_type, index, chunk, COMPRESSION_LEVEL if compress else 0)
+
+        if self.compression == ZLIB and len(chunk) >= COMPRESSION_THRESHOLD:
+            return message.write_compressed_file_chunk(
+                worker_id, file_type, index, zlib.compress(chunk.encode(), COMPRESSION_LEVEL))
+
+        return message.write_file_chunk(worker_id, file_type, index, chunk)
+
+    def get_messages_to_send(self, limit: int = WINDOW_SIZE) -> [bytes]:
+        """
+        :param limit: Maximum number of chunks to return
+        :return: Chunks to send again, followed by new chunks until the window is full
+        """
+
+        if time() - self.acknowledged_at >= RETRANSMIT_TIMEOUT:
+            # Nothing came back, the chunks or their acknowledgements are lost
+            self.retransmissions |= self.in_flight
+            self.acknowledged_at = time()
+
+        indices = sorted(self.retransmissions)[:limit]
+        self.retransmissions.difference_update(indices)
+
+        while len(indices) < limit and len(self.in_flight) < WINDOW_SIZE and self.number_of_chunks is None:
+            index = self.next_index
+            chunk_message = self.read_next_message()
+
+            if chunk_message is None:
+                self.number_of_chunks = index
+            else:
+                self.chunks[index] = chunk_message
+                self.in_flight.add(index)
+                indices.append(index)
+
+        for index in indices:
+            self.send_order[index] = self.number_sent
+            self.number_sent += 1
+
+        return [self.chunks[index] for index in indices]
+
+    def handle_chunk_ack(self, index: int, received_indices: [int]):
+        """
+        :param index: Index of the first chunk the receiver misses
+        :param received_indices: Indices of the chunks after it that the receiver has buffered
+        """
+
+        acknowledged = {i for i in self.in_flight if i < index or i in received_indices}
+        if len(acknowledged) == 0 and index <= self.index:
+            return
+
+        # The chunks that were sent before an acknowledged chunk did not arrive
+        last_sent = max([self.send_order[i] for i in acknowledged], default=-1)
+
+        self.in_flight -= acknowledged
+        self.retransmissions -= acknowledged
+        for i in acknowledged:
+            self.bytes_acknowledged += len(self.chunks[i])
+            del self.send_order[i]
+            del self.chunks[i]
+
+        self.retransmissions |= {i for i in self.in_flight if self.send_order[i] < last_sent}
+        self.index = max(self.index, index)
+        self.acknowledged_at = time()
+
+    def handle_resume_file(self, index: int, digest: str):
+        """
+        :param index: Number of chunks the receiver already has
+        :param digest: Running digest of those chunks
+        """
+
+        if self.resumed:
+            return
+
+        # Skipped chunks are only read for their digest
+        while self.next_index < index and self.number_of_chunks is None:
+            if self.read_next_chunk() is None:
+                self.number_of_chunks = self.next_index
+
+        if index >= len(self.digests) or self.digests[index] != digest:
+            # The receiver has chunks of other data
+            self.restart()
+            self.resume = False
+            self.start_sent = False
+            return
+
+        self.index = index
+        self.resumed = True
+        self.acknowledged_at = time()
+
+    def handle_missing_chunk(self, index: int):
+        """
+        The receiver misses chunks at END_SEND_FILE, send the chunks from the first missing chunk on again.
+        Acknowledged chunks are no longer held, the receiver already has those.
+
+        :param index: Index of the first chunk the receiver misses
+        """
+
+        self.retransmissions |= {i for i in self.in_flight if i >= index}
+
+
+class TokenBucket:
+    """ Limits the rate at which bytes are sent. A message may overdraw the bucket, the next one waits until it
+    is filled again, so messages larger than a second of bandwidth are sent as well.
+    """
+
+    def __init__(self, rate: float):
+        """
+        :param rate: Bytes per second, the bucket holds at most one second of them
+        """
+
+        self.rate = rate
+        self.tokens = rate
+        self.filled_at = time()
+
+    def fill(self):
+        now = time()
+        self.tokens = min(self.rate, self.tokens + (now - self.filled_at) * self.rate)
+        self.filled_at = now
+
+    def get_delay(self) -> float:
+        """
+        :return: Seconds to wait before the next message may be sent
+        """
+
+        self.fill()
+
+        return max(0.0, -self.tokens / self.rate)
+
+    def consume(self, size: int):
+        self.fill()
+        self.tokens -= size
+
+
+def send_file(node, send_message, file_sender: FileSender):
+    """
+    Sends a file and handles incoming messages until the receiver has confirmed it
+
+    :param node: Server that receives the acknowledgements of the receiver
+    :param send_message: Function that sends a message to the receiver
+    :param file_sender: Sender of the file
+    """
+
+    send_files(node, [(send_message, file_sender)])
+
+
+def send_files(node, transfers: list, report_progress=None):
+    """
+    Sends files to several receivers at the same time, one chunk to each receiver in turn, and handles incoming
+    messages until every receiver has confirmed its file. The chunks of all transfers together are sent at no
+    more than `bandwidth`.
+
+    :param node: Server that receives the acknowledgements of the receivers
+    :param transfers: List of pairs of a function that sends a message to the receiver and the sender of the file
+    :param report_progress: Function that is called with the unconfirmed senders every PROGRESS_INTERVAL seconds,
+        or None
+    """
+
+    token_bucket = TokenBucket(bandwidth) if bandwidth > 0 else None
+    reported_at = time()
+
+    def get_delay() -> float:
+        return 0.0 if token_bucket is None else token_bucket.get_delay()
 
-        return chunk, lines
+    def can_send_chunk(file_sender: FileSender) -> bool:
+        return not file_sender.complete_file_send and not file_sender.confirmed and file_sender.can_send() \
+            and get_delay() == 0
 
-    def create_messages(self, worker_id: int, data: list, file_type: int):
-        messages = []
-        while len(data) > 0:
-            chunk, lines_in_chunk = self.get_file_chunk(worker_id, file_type, len(messages), data)
-            del data[:lines_in_chunk]
-            messages.append(message.write_file_chunk(worker_id, file_type, len(messages), chunk))
+    while not all(file_sender.confirmed for _, file_sender in transfers):
+        for send_message, file_sender in transfers:
+            if file_sender.can_send_start():
+                send_message(message.write_start_send_file(
+                    file_sender.worker_id, file_sender.file_type, file_sender.transfer_id, file_sender.content_hash,
+                    file_sender.resume))
+                file_sender.start_sent = True
+            elif file_sender.can_send_end():
+                send_message(message.write_end_send_file(
+                    file_sender.worker_id, file_sender.file_type, file_sender.number_of_chunks))
+                file_sender.end_sent_at = time()
+            elif can_send_chunk(file_sender):
+                for chunk_message in file_sender.get_messages_to_send(limit=1):
+                    send_message(chunk_message)
 
-        return messages
+                    if token_bucket is not None:
+                        token_bucket.consume(len(chunk_message))
 
-    def get_next_message(self):
-        next_message = self.messages[self.index]
-        self.index += 1
+        if report_progress is not None and time() - reported_at >= PROGRESS_INTERVAL:
+            report_progress([file_sender for _, file_sender in transfers if not file_sender.confirmed])
+            reported_at = time()
 
-        return next_message
+        # Acknowledgements open the windows, wakes up as well for confirmations, requests for missing chunks and
+        # when the bandwidth allows the next chunk
+        node.handle_queue()
+        node.wait_for_messages(
+            lambda: any(file_sender.can_send_start() or file_sender.can_send_end() or can_send_chunk(file_sender)
+                        for _, file_sender in transfers)
+            or all(file_sender.confirmed for _, file_sender in transfers),
+            timeout=min(END_SEND_FILE_TIMEOUT, get_delay() or END_SEND_FILE_TIMEOUT))
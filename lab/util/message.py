@@ -1,6 +1,14 @@
+import base64
+import binascii
 import json
+from json.encoder import encode_basestring_ascii
+import struct
+import zlib
 
-MAX_MESSAGE_SIZE = 1024
+import numpy as np
+
+# Messages are framed by lab.util.sockets, file chunks are cut at this size
+MAX_MESSAGE_SIZE = 4 * 1024 * 1024
 GRAPH = 100
 BACKUP = 101
 
@@ -23,13 +31,250 @@ MISSING_CHUNK = 215
 RECEIVED_FILE = 216
 END_SEND_FILE = 217
 PROGRESS = 218
+SHARED_MEMORY = 219  # Master to Worker, replaces sending the graph on a single host
+COMPRESSED_FILE_CHUNK = 220  # Read as FILE_CHUNK
+CHUNK_ACK = 221  # Response to FILE_CHUNK, selective acknowledgement
+INT32_EDGE_CHUNK = 222  # Read as FILE_CHUNK, with an array of edges as chunk
+INT64_EDGE_CHUNK = 223  # Read as FILE_CHUNK, with an array of edges as chunk
+BULK_FILE = 224  # Master to Worker, download a file from the file server of the master, see `lab.util.bulk_transfer`
+RESUME_FILE = 225  # Response to START_SEND_FILE, number of chunks the receiver already has
+COMPRESSED_INT32_EDGE_CHUNK = 226  # Read as FILE_CHUNK, with an array of edges as chunk
+COMPRESSED_INT64_EDGE_CHUNK = 227  # Read as FILE_CHUNK, with an array of edges as chunk
+
+
+# Bulk messages, handled after all other (control) messages that have been received, see `lab.util.server`
+DATA_STATUSES = {START_SEND_FILE, FILE_CHUNK, COMPRESSED_FILE_CHUNK, INT32_EDGE_CHUNK, INT64_EDGE_CHUNK,
+                 COMPRESSED_INT32_EDGE_CHUNK, COMPRESSED_INT64_EDGE_CHUNK, END_SEND_FILE, PROGRESS, DEBUG}
+
+# Fields of each message that the binary codec stores in the `worker_id`, `file_type` and `index` slots
+# of its header and as raw body. Messages of statuses that are not listed have their body encoded as JSON.
+BINARY_LAYOUT = {
+    ALIVE: ('worker_id', None, None, None),
+    DEBUG: ('worker_id', None, None, 'debug_message'),
+    RANDOM_WALKER: (None, None, None, 'vertex_labels'),
+    FINISH_JOB: ('worker_id', None, None, None),
+    JOB_COMPLETE: ('worker_id', None, None, None),
+    TERMINATE: (None, None, None, None),
+    WORKER_FAILED: (None, None, None, None),
+    RANDOM_WALKER_COUNT: ('worker_id', None, 'count', None),
+    CONTINUE: (None, None, None, None),
+    FILE_CHUNK: ('worker_id', 'file_type', 'index', 'chunk'),
+    MISSING_CHUNK: ('worker_id', 'file_type', 'index', None),
+    RECEIVED_FILE: ('worker_id', 'file_type', None, None),
+    END_SEND_FILE: ('worker_id', 'file_type', 'number_of_chunks', None),
+    PROGRESS: ('worker_id', None, 'count', None),
+    SHARED_MEMORY: ('worker_id', 'number_of_workers', 'number_of_edges', 'prefix'),
+    COMPRESSED_FILE_CHUNK: ('worker_id', 'file_type', 'index', 'compressed_chunk'),
+    CHUNK_ACK: ('worker_id', 'file_type', 'index', 'received_indices'),
+    INT32_EDGE_CHUNK: ('worker_id', 'file_type', 'index', 'edges'),
+    INT64_EDGE_CHUNK: ('worker_id', 'file_type', 'index', 'edges'),
+    COMPRESSED_INT32_EDGE_CHUNK: ('worker_id', 'file_type', 'index', 'compressed_edges'),
+    COMPRESSED_INT64_EDGE_CHUNK: ('worker_id', 'file_type', 'index', 'compressed_edges')
+}
+
+# Fields that hold bytes instead of a string, JSON stores them as base64
+BYTES_FIELDS = ['compressed_chunk', 'edges', 'compressed_edges']
+
+# Messages that carry the CRC-32 of their body field, a message that does not match it is dropped like any message
+# that cannot be decoded
+CHECKSUM_STATUSES = {FILE_CHUNK, COMPRESSED_FILE_CHUNK, INT32_EDGE_CHUNK, INT64_EDGE_CHUNK, COMPRESSED_INT32_EDGE_CHUNK,
+                     COMPRESSED_INT64_EDGE_CHUNK}
+
+
+class CorruptMessage(ValueError):
+    pass
+
+
+def get_checksum(status: int, body: dict) -> int:
+    value = body[BINARY_LAYOUT[status][3]]
+
+    return zlib.crc32(value if isinstance(value, bytes) else value.encode())
+
+
+# Edges are packed as pairs of little-endian integers, of the smallest of these types that holds every vertex
+EDGE_TYPES = {
+    INT32_EDGE_CHUNK: np.dtype('<i4'),
+    INT64_EDGE_CHUNK: np.dtype('<i8'),
+    COMPRESSED_INT32_EDGE_CHUNK: np.dtype('<i4'),
+    COMPRESSED_INT64_EDGE_CHUNK: np.dtype('<i8')
+}
+
+# Status of the edges of each type after zlib compression
+COMPRESSED_EDGE_STATUSES = {
+    INT32_EDGE_CHUNK: COMPRESSED_INT32_EDGE_CHUNK,
+    INT64_EDGE_CHUNK: COMPRESSED_INT64_EDGE_CHUNK
+}
+
+
+class JsonCodec:
+    """ Encodes the complete message as JSON, readable but slow. Use it for debugging.
+    """
+
+    name = 'json'
+
+    @staticmethod
+    def encode(status: int, body: dict or list) -> bytes:
+        if isinstance(body, dict):
+            if status in CHECKSUM_STATUSES:
+                body = {**body, 'checksum': get_checksum(status, body)}
+
+            body = {
+                field: base64.b64encode(value).decode() if field in BYTES_FIELDS else value
+                for field, value in body.items()
+            }
+
+        return json.dumps({'status': status, 'body': body}).encode()
+
+    @staticmethod
+    def decode(message: bytes) -> (int, dict or list):
+        content = json.loads(message.decode())
+        status, body = content['status'], content['body']
+
+        if isinstance(body, dict):
+            for field in BYTES_FIELDS:
+                if field in body:
+                    body[field] = base64.b64decode(body[field])
+
+            if status in CHECKSUM_STATUSES and body.pop('checksum') != get_checksum(status, body):
+                raise CorruptMessage(f'Checksum mismatch in message with status {status}')
+
+        return status, body
+
+    @staticmethod
+    def get_encoded_length(value: str) -> int:
+        # Escapes like json.dumps, without its overhead per call and without the surrounding quotes
+        return len(encode_basestring_ascii(value)) - 2
+
+    @staticmethod
+    def get_encoded_bytes_length(length: int) -> int:
+        # Base64
+        return (length + 2) // 3 * 4
+
+
+class BinaryCodec:
+    """ Packs status, worker_id, file_type and index in a fixed size header, followed by the body as raw bytes
+    """
+
+    name = 'binary'
+    header = struct.Struct('!Hihq')
+    # Follows the header of the messages of CHECKSUM_STATUSES
+    checksum = struct.Struct('!I')
+
+    # Stored in an integer slot when a field is None
+    NONE = -1
+
+    # Raw bodies that hold a list of integers instead of a string
+    INT_LIST_FIELDS = ['vertex_labels', 'received_indices']
+
+    def encode(self, status: int, body: dict or list) -> bytes:
+        if status not in BINARY_LAYOUT:
+            return self.header.pack(status, self.NONE, self.NONE, self.NONE) + json.dumps(body).encode()
+
+        if not isinstance(body, dict):
+            # no content
+            body = {}
+
+        worker_id_field, file_type_field, index_field, body_field = BINARY_LAYOUT[status]
+        raw_body = self.encode_body(body, body_field)
+
+        header = self.header.pack(
+            status,
+            self.get_int(body, worker_id_field),
+            self.get_int(body, file_type_field),
+            self.get_int(body, index_field)
+        )
+
+        if status in CHECKSUM_STATUSES:
+            header += self.checksum.pack(zlib.crc32(raw_body))
+
+        return header + raw_body
+
+    def decode(self, message: bytes) -> (int, dict or list):
+        status, *values = self.header.unpack_from(message)
+        offset = self.header.size
+
+        if status in CHECKSUM_STATUSES:
+            checksum, = self.checksum.unpack_from(message, offset)
+            offset += self.checksum.size
+
+            if checksum != zlib.crc32(memoryview(message)[offset:]):
+                raise CorruptMessage(f'Checksum mismatch in message with status {status}')
+
+        raw_body = message[offset:]
+
+        if status not in BINARY_LAYOUT:
+            return status, json.loads(raw_body.decode())
+
+        *int_fields, body_field = BINARY_LAYOUT[status]
+        body = {}
+
+        for field, value in zip(int_fields, values):
+            if field is not None:
+                body[field] = None if value == self.NONE else value
+
+        if body_field is not None:
+            body[body_field] = self.decode_body(raw_body, body_field)
+
+        return status, body
+
+    def encode_body(self, body: dict, field: str or None) -> bytes:
+        if field is None:
+            return b''
+
+        if field in self.INT_LIST_FIELDS:
+            return struct.pack(f'!{len(body[field])}q', *body[field])
+
+        if field in BYTES_FIELDS:
+            return body[field]
+
+        return body[field].encode()
+
+    def decode_body(self, raw_body: bytes, field: str):
+        if field in self.INT_LIST_FIELDS:
+            return list(struct.unpack(f'!{len(raw_body) // 8}q', raw_body))
+
+        if field in BYTES_FIELDS:
+            return raw_body
+
+        return raw_body.decode()
+
+    def get_int(self, body: dict, field: str or None) -> int:
+        if field is None or body.get(field) is None:
+            return self.NONE
+
+        return body[field]
+
+    @staticmethod
+    def get_encoded_length(value: str) -> int:
+        return len(value.encode())
+
+    @staticmethod
+    def get_encoded_bytes_length(length: int) -> int:
+        return length
+
+
+CODECS = {
+    JsonCodec.name: JsonCodec(),
+    BinaryCodec.name: BinaryCodec()
+}
+
+# Raised by `read` for messages that cannot be decoded
+DECODE_ERRORS = (json.JSONDecodeError, struct.error, UnicodeDecodeError, zlib.error, binascii.Error, CorruptMessage)
+
+# Codec used to write messages, any codec can be read
+codec = CODECS[BinaryCodec.name]
+
+
+def set_codec(name: str):
+    global codec
+    codec = CODECS[name]
 
 
 def write(status: int, body: dict or list = None):
     if body is None:
         # no content
         body = ''
-    return json.dumps({'status': status, 'body': body}).encode()
+    return codec.encode(status, body)
 
 
 def write_alive(worker_id: int):
@@ -41,13 +286,15 @@ def write_alive(worker_id: int):
     )
 
 
-def write_register(worker_id: int, host: str, port: int):
+def write_register(worker_id: int, host: str, port: int, socket_path: str = None, compression: str = 'none'):
     return write(
         status=REGISTER,
         body={
             'worker_id': worker_id,
             'host': host,
-            'port': port
+            'port': port,
+            'socket_path': socket_path,
+            'compression': compression
         }
     )
 
@@ -66,11 +313,11 @@ def write_debug(worker_id: int, debug_message: str):
     )
 
 
-def write_random_walker(vertex_label: int):
+def write_random_walker(vertex_labels: list):
     return write(
         status=RANDOM_WALKER,
         body={
-            'vertex_label': vertex_label
+            'vertex_labels': vertex_labels
         }
     )
 
@@ -106,11 +353,34 @@ def write_continue():
     )
 
 
-def write_start_send_file(worker_id: int, file_type: int, number_of_chunks: int):
+def write_start_send_file(worker_id: int, file_type: int, transfer_id: str, content_hash: str = '',
+                          resume: bool = False):
+    """
+    :param transfer_id: Id of the data that is sent, the same for data that extends data sent before
+    :param resume: Boolean whether the receiver may keep the chunks of the transfer it has from earlier
+    """
+
     return write(status=START_SEND_FILE, body={
         'worker_id': worker_id,
         'file_type': file_type,
-        'number_of_chunks': number_of_chunks
+        'transfer_id': transfer_id,
+        'content_hash': content_hash,
+        'resume': resume
+    })
+
+
+def write_resume_file(worker_id: int, file_type: int, transfer_id: str, index: int, digest: str):
+    """
+    :param index: Number of chunks the receiver already has, the sender continues with the chunk after them
+    :param digest: Running digest of those chunks, see `lab.util.file_transfer.get_chunk_bytes`
+    """
+
+    return write(status=RESUME_FILE, body={
+        'worker_id': worker_id,
+        'file_type': file_type,
+        'transfer_id': transfer_id,
+        'index': index,
+        'digest': digest
     })
 
 
@@ -123,6 +393,57 @@ def write_file_chunk(worker_id: int, file_type: int, index: int, chunk: str):
     })
 
 
+def write_compressed_file_chunk(worker_id: int, file_type: int, index: int, compressed_chunk: bytes):
+    return write(status=COMPRESSED_FILE_CHUNK, body={
+        'worker_id': worker_id,
+        'file_type': file_type,
+        'index': index,
+        'compressed_chunk': compressed_chunk
+    })
+
+
+def write_edge_chunk(worker_id: int, file_type: int, index: int, edges: np.ndarray, compression_level: int = 0):
+    """
+    :param edges: Array of shape (number of edges, 2)
+    :param compression_level: zlib level to compress the packed edges with, 0 to send them raw
+    """
+
+    # The range of int32 covers the vertices of most graphs, which halves the size of the chunk
+    int32 = EDGE_TYPES[INT32_EDGE_CHUNK]
+    fits_int32 = len(edges) == 0 or (edges.min() >= np.iinfo(int32).min and edges.max() <= np.iinfo(int32).max)
+    status = INT32_EDGE_CHUNK if fits_int32 else INT64_EDGE_CHUNK
+    packed_edges = edges.astype(EDGE_TYPES[status], copy=False).tobytes()
+
+    if compression_level > 0:
+        return write(status=COMPRESSED_EDGE_STATUSES[status], body={
+            'worker_id': worker_id,
+            'file_type': file_type,
+            'index': index,
+            'compressed_edges': zlib.compress(packed_edges, compression_level)
+        })
+
+    return write(status=status, body={
+        'worker_id': worker_id,
+        'file_type': file_type,
+        'index': index,
+        'edges': packed_edges
+    })
+
+
+def write_bulk_file(worker_id: int, file_type: int, file_id: str, size: int, content_hash: str, host: str, port: int,
+                    socket_path: str = None):
+    return write(status=BULK_FILE, body={
+        'worker_id': worker_id,
+        'file_type': file_type,
+        'file_id': file_id,
+        'size': size,
+        'content_hash': content_hash,
+        'host': host,
+        'port': port,
+        'socket_path': socket_path
+    })
+
+
 def write_missing_chunk(worker_id: int, file_type: int, index: int):
     return write(status=MISSING_CHUNK, body={
         'worker_id': worker_id,
@@ -131,6 +452,20 @@ def write_missing_chunk(worker_id: int, file_type: int, index: int):
     })
 
 
+def write_chunk_ack(worker_id: int, file_type: int, index: int, received_indices: list):
+    """
+    :param index: Index of the first chunk that has not been received, all chunks before it have been
+    :param received_indices: Indices of the chunks after it that have been received out of order
+    """
+
+    return write(status=CHUNK_ACK, body={
+        'worker_id': worker_id,
+        'file_type': file_type,
+        'index': index,
+        'received_indices': received_indices
+    })
+
+
 def write_received_file(worker_id: int, file_type: int):
     return write(
         status=RECEIVED_FILE, body={
@@ -140,12 +475,13 @@ def write_received_file(worker_id: int, file_type: int):
     )
 
 
-def write_end_send_file(worker_id: int, file_type: int):
+def write_end_send_file(worker_id: int, file_type: int, number_of_chunks: int):
     return write(
         status=END_SEND_FILE,
         body={
             'worker_id': worker_id,
-            'file_type': file_type
+            'file_type': file_type,
+            'number_of_chunks': number_of_chunks
         }
     )
 
@@ -160,13 +496,25 @@ def write_progress(worker_id: int, count: int):
     )
 
 
+def write_shared_memory(worker_id: int, prefix: str, number_of_workers: int, number_of_edges: int):
+    return write(
+        status=SHARED_MEMORY,
+        body={
+            'worker_id': worker_id,
+            'prefix': prefix,
+            'number_of_workers': number_of_workers,
+            'number_of_edges': number_of_edges
+        }
+    )
+
+
 def read_status(status):
     # Returns a constant function
     return lambda body: (status,)
 
 
 def read_register(body: dict):
-    return REGISTER, body['worker_id'], body['host'], body['port']
+    return REGISTER, body['worker_id'], body['host'], body['port'], body['socket_path'], body['compression']
 
 
 def read_alive(body: dict):
@@ -182,7 +530,7 @@ def read_debug(body: dict):
 
 
 def read_random_walker(body: dict):
-    return RANDOM_WALKER, body['vertex_label']
+    return RANDOM_WALKER, body['vertex_labels']
 
 
 def read_job_complete(body: dict):
@@ -194,33 +542,88 @@ def read_random_walker_count(body: dict):
 
 
 def read_start_send_file(body: dict):
-    return START_SEND_FILE, body['worker_id'], body['file_type'], body['number_of_chunks']
+    return START_SEND_FILE, body['worker_id'], body['file_type'], body['transfer_id'], body['content_hash'], \
+        body['resume']
+
+
+def read_resume_file(body: dict):
+    return RESUME_FILE, body['worker_id'], body['file_type'], body['transfer_id'], body['index'], body['digest']
 
 
 def read_file_chunk(body: dict):
     return FILE_CHUNK, body['worker_id'], body['file_type'], body['index'], body['chunk']
 
 
+def read_compressed_file_chunk(body: dict):
+    return FILE_CHUNK, body['worker_id'], body['file_type'], body['index'], \
+        zlib.decompress(body['compressed_chunk']).decode()
+
+
+def read_edge_chunk(status):
+    # Returns a function that reads the edges with the type of the status
+    return lambda body: (FILE_CHUNK, body['worker_id'], body['file_type'], body['index'],
+                         np.frombuffer(body['edges'], dtype=EDGE_TYPES[status]).reshape(-1, 2))
+
+
+def read_compressed_edge_chunk(status):
+    # Returns a function that decompresses and reads the edges with the type of the status
+    return lambda body: (FILE_CHUNK, body['worker_id'], body['file_type'], body['index'],
+                         np.frombuffer(zlib.decompress(body['compressed_edges']),
+                                       dtype=EDGE_TYPES[status]).reshape(-1, 2))
+
+
+def read_bulk_file(body: dict):
+    return BULK_FILE, body['worker_id'], body['file_type'], body['file_id'], body['size'], body['content_hash'], \
+        body['host'], body['port'], body['socket_path']
+
+
 def read_missing_chunk(body: dict):
     return MISSING_CHUNK, body['worker_id'], body['file_type'], body['index']
 
 
+def read_chunk_ack(body: dict):
+    return CHUNK_ACK, body['worker_id'], body['file_type'], body['index'], body['received_indices']
+
+
 def read_received_file(body: dict):
     return RECEIVED_FILE, body['worker_id'], body['file_type']
 
 
 def read_end_send_file(body: dict):
-    return END_SEND_FILE, body['worker_id'], body['file_type']
+    return END_SEND_FILE, body['worker_id'], body['file_type'], body['number_of_chunks']
 
 
 def read_progress(body: dict):
     return PROGRESS, body['worker_id'], body['count']
 
 
+def read_shared_memory(body: dict):
+    return SHARED_MEMORY, body['worker_id'], body['prefix'], body['number_of_workers'], body['number_of_edges']
+
+
+def peek_status(message: bytes) -> int:
+    """
+    Reads the status of a message without decoding the rest of it
+
+    :param message: Message written by any codec
+    :return: Status
+    """
+
+    if message[:1] == b'{':
+        # The JSON codec writes the status first: {"status": 200, ...
+        return int(message[11:message.index(b',', 11)])
+
+    return struct.unpack_from('!H', message)[0]
+
+
 def read(message: bytes):
-    content = json.loads(message.decode())
+    # JSON messages start with a curly bracket, binary messages with the high byte of their status
+    if message[:1] == b'{':
+        status, body = CODECS[JsonCodec.name].decode(message)
+    else:
+        status, body = CODECS[BinaryCodec.name].decode(message)
 
-    return MESSAGE_INTERFACE[content['status']](content['body'])
+    return MESSAGE_INTERFACE[status](body)
 
 
 MESSAGE_INTERFACE = {
@@ -240,5 +643,14 @@ MESSAGE_INTERFACE = {
     FILE_CHUNK: read_file_chunk,
     MISSING_CHUNK: read_missing_chunk,
     END_SEND_FILE: read_end_send_file,
-    PROGRESS: read_progress
+    PROGRESS: read_progress,
+    SHARED_MEMORY: read_shared_memory,
+    COMPRESSED_FILE_CHUNK: read_compressed_file_chunk,
+    CHUNK_ACK: read_chunk_ack,
+    INT32_EDGE_CHUNK: read_edge_chunk(INT32_EDGE_CHUNK),
+    INT64_EDGE_CHUNK: read_edge_chunk(INT64_EDGE_CHUNK),
+    BULK_FILE: read_bulk_file,
+    RESUME_FILE: read_resume_file,
+    COMPRESSED_INT32_EDGE_CHUNK: read_compressed_edge_chunk(COMPRESSED_INT32_EDGE_CHUNK),
+    COMPRESSED_INT64_EDGE_CHUNK: read_compressed_edge_chunk(COMPRESSED_INT64_EDGE_CHUNK)
 }
@@ -1,18 +1,30 @@
+from bisect import bisect_right
 from typing import List
 
+import numpy as np
+
 
 class MetaData:
-    def __init__(self, worker_id: int, number_of_edges: int, min_vertex: int, max_vertex: int, host: str = None, port: str = None):
+    def __init__(self, worker_id: int, number_of_edges: int, min_vertex: int, max_vertex: int, host: str = None, port: str = None,
+                 socket_path: str = None, compression: str = 'none', number_of_cut_edges: int = 0,
+                 content_hash: str = ''):
         self.worker_id = worker_id
         self.number_of_edges = number_of_edges
         self.min_vertex = min_vertex
         self.max_vertex = max_vertex
         self.host = host
         self.port = port
-
-    def set_connection_info(self, host, port):
+        self.socket_path = socket_path
+        self.compression = compression
+        # Edges of the sub graph to a vertex of another worker, only known to the master
+        self.number_of_cut_edges = number_of_cut_edges
+        # SHA-256 hash of the sub graph file, taken while it is written, only known to the master
+        self.content_hash = content_hash
+
+    def set_connection_info(self, host, port, socket_path=None):
         self.host = host
         self.port = port
+        self.socket_path = socket_path
 
     def get_connection_info(self):
         return self.host, self.port
@@ -30,17 +42,34 @@ class MetaData:
             'min_vertex': self.min_vertex,
             'max_vertex': self.max_vertex,
             'host': self.host,
-            'port': self.port
+            'port': self.port,
+            'socket_path': self.socket_path,
+            'compression': self.compression
         }
 
 
 class CombinedMetaData:
+    """
+    Meta data of all workers. The vertex ranges of the workers do not overlap, the worker of a vertex is found with
+    a binary search on the smallest vertices of the workers.
+    """
+
     def __init__(self, all_meta_data: List[MetaData]):
         self.combined_meta_data = self.create_combined_meta_data(all_meta_data)
         self.top_layer = self.find_top_layer
         self.bottom_layer = self.find_bottom_layer
         self.combined_number_of_edges = self.get_combined_number_of_edges
 
+        sorted_meta_data = sorted(self.combined_meta_data.values(), key=lambda meta_data: meta_data.min_vertex)
+        self.min_vertices = [meta_data.min_vertex for meta_data in sorted_meta_data]
+        self.max_vertices = [meta_data.max_vertex for meta_data in sorted_meta_data]
+        self.worker_ids = [meta_data.worker_id for meta_data in sorted_meta_data]
+
+        # The same boundaries as arrays, to look up many vertices at once
+        self.min_vertex_array = np.array(self.min_vertices, dtype=np.int64)
+        self.max_vertex_array = np.array(self.max_vertices, dtype=np.int64)
+        self.worker_id_array = np.array(self.worker_ids, dtype=np.int64)
+
     @staticmethod
     def create_combined_meta_data(all_meta_data: List[MetaData]) -> dict:
         combined_meta_data = {}
@@ -82,15 +111,29 @@ class CombinedMetaData:
         return self.combined_meta_data[worker_id]
 
     def get_worker_id_that_has_vertex(self, vertex: int):
-        for worker_id, meta_data in self.combined_meta_data.items():
-            if meta_data.has_vertex(vertex):
-                return worker_id
+        index = bisect_right(self.min_vertices, vertex) - 1
 
-        raise Exception("Vertex could not be matched to any of the workers")
+        if index < 0 or vertex > self.max_vertices[index]:
+            raise Exception("Vertex could not be matched to any of the workers")
 
-    def get_connection_that_has_vertex(self, vertex: int):
-        for meta_data in self.combined_meta_data.values():
-            if meta_data.has_vertex(vertex):
-                return meta_data.get_connection_info()
+        return self.worker_ids[index]
+
+    def get_worker_ids_that_have_vertices(self, vertices: np.ndarray, strict: bool = True) -> np.ndarray:
+        """
+        :param vertices: Array of vertices
+        :param strict: Whether every vertex should be in the range of a worker, otherwise a vertex goes to the worker
+            with the closest range below it, or to the bottom layer
+        :return: Array of the worker of every vertex
+        """
+
+        indices = np.searchsorted(self.min_vertex_array, vertices, side='right') - 1
 
-        raise Exception("Vertex could not be matched to any of the workers")
+        if not strict:
+            indices = np.maximum(indices, 0)
+        elif np.any(indices < 0) or np.any(vertices > self.max_vertex_array[indices]):
+            raise Exception("Vertex could not be matched to any of the workers")
+
+        return self.worker_id_array[indices]
+
+    def get_connection_that_has_vertex(self, vertex: int):
+        return self.combined_meta_data[self.get_worker_id_that_has_vertex(vertex)].get_connection_info()
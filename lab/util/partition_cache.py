@@ -0,0 +1,107 @@
+import os
+import string
+from tempfile import gettempdir
+
+import numpy as np
+
+# Directory of the partition cache of the workers on this host, None for the default
+cache_dir = None
+# Maximum size of the cache in bytes, 0 to not cache partitions
+cache_size = 0
+
+
+def set_cache(directory: str or None, size: int):
+    global cache_dir, cache_size
+    cache_dir = directory
+    cache_size = size
+
+
+def get_cache():
+    """
+    :return: Cache of this host with the settings of set_cache, None if caching is off
+    """
+
+    if cache_size <= 0:
+        return None
+
+    return PartitionCache(cache_dir or os.path.join(gettempdir(), 'scaler-cache'), cache_size)
+
+
+def is_content_hash(value: str) -> bool:
+    # Hashes are used as file names, so anything else could point outside the cache
+    return len(value) == 64 and all(character in string.hexdigits for character in value)
+
+
+class PartitionCache:
+    """ Sub graphs received by the workers on a host, stored by the hash of their edges so a worker that gets the
+    same sub graph again, in a later run or after a restart, does not need it sent. Partitions are stored as pairs
+    of little-endian int64, see `FileReceiver.load_cached`. Once the cache exceeds its size, the partitions that
+    were used the longest ago are removed.
+    """
+
+    def __init__(self, directory: str, max_size: int):
+        self.directory = directory
+        self.max_size = max_size
+
+        os.makedirs(directory, exist_ok=True)
+
+    def get_path(self, content_hash: str) -> str:
+        return os.path.join(self.directory, f'{content_hash}.edges')
+
+    def get(self, content_hash: str) -> str or None:
+        """
+        :param content_hash: Hash of the partition
+        :return: Path of the cached partition, None if it is not cached
+        """
+
+        if not is_content_hash(content_hash):
+            return None
+
+        path = self.get_path(content_hash)
+        try:
+            # The modification time keeps track of the last use
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+
+        return path
+
+    def put(self, content_hash: str, edges: np.ndarray):
+        """
+        Writes a partition into the cache and removes the least recently used partitions if it gets too large
+
+        :param content_hash: Hash of the partition, see `file_io.get_edges_hash`
+        :param edges: Partition, as an array of shape (number of edges, 2)
+        """
+
+        if not is_content_hash(content_hash):
+            return
+
+        # Other workers on this host never see a partially written partition
+        path = self.get_path(content_hash)
+        temporary_path = f'{path}.{os.getpid()}'
+        edges.astype('<i8', copy=False).tofile(temporary_path)
+        os.replace(temporary_path, path)
+
+        self.evict()
+
+    def evict(self):
+        partitions = []
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.name.endswith('.edges'):
+                    partitions.append((entry.stat().st_mtime, entry.stat().st_size, entry.path))
+            except FileNotFoundError:
+                # Removed by another worker
+                continue
+
+        size = sum(partition_size for _, partition_size, _ in partitions)
+        for _, partition_size, path in sorted(partitions):
+            if size <= self.max_size:
+                break
+
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= partition_size
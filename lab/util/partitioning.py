@@ -0,0 +1,631 @@
+import os
+from itertools import islice
+from mmap import mmap, ACCESS_READ
+from multiprocessing import Pool
+from tempfile import TemporaryDirectory
+from typing import List
+
+import numpy as np
+
+from lab.util.file_io import read_edges_as_array, write_edges, sort_edges, sort_file, format_edges, read_edge_blocks, \
+    parse_edges
+from lab.util.meta_data import MetaData, CombinedMetaData
+
+STREAM = 'stream'
+NUMPY = 'numpy'
+PARALLEL = 'parallel'
+
+RANGES = 'ranges'
+GREEDY = 'greedy'
+
+# Size of the write buffer of every partition file
+BUFFER_SIZE = 1024 * 1024
+# Number of edges of which the reversed edges are routed to a worker at once
+ROUTING_BLOCK_SIZE = 65536
+# Maximum number of bytes of the graph that is parsed at once, by every process of the parallel engine
+RANGE_SIZE = 64 * 1024 * 1024
+# Degree a worker may get with the greedy strategy, relative to an equal share
+GREEDY_CAPACITY = 1.1
+# Number of bytes of the graph the greedy strategy assigns at once, the edges of a block are turned into lists
+GREEDY_BLOCK_SIZE = 1024 * 1024
+
+# How the master splits the graph, `STREAM` for graphs of any size, `NUMPY` for graphs that fit in memory or
+# `PARALLEL` to use all cores for graphs of which a sub graph fits in memory
+engine = STREAM
+# Number of processes of the parallel engine, 0 for one per core
+processes = 0
+# Which vertices go to which worker, `RANGES` of consecutive vertices or `GREEDY` to cut as few edges as possible
+strategy = RANGES
+
+
+def set_engine(name: str, number_of_processes: int = 0):
+    global engine, processes
+    engine = name
+    processes = number_of_processes
+
+
+def set_strategy(name: str):
+    global strategy
+    strategy = name
+
+
+def read_runs(graph_path: str) -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray, int):
+    """
+    First pass over the graph, which is sorted by start vertex. The degrees are counted with a sorted array of the
+    vertices instead of a dict, a vertex costs 16 bytes.
+
+    :param graph_path: Path to the graph, one edge per line
+    :return: Start vertex of every run of edges with the same start vertex, length of every run, every vertex in
+        increasing order, degree of every vertex, number of edges
+    """
+
+    run_vertices = [np.empty(0, dtype=np.int64)]
+    run_lengths = [np.empty(0, dtype=np.int64)]
+    vertices = np.empty(0, dtype=np.int64)
+    degrees = np.empty(0, dtype=np.int64)
+    number_of_edges = 0
+
+    for edges in read_edge_blocks(graph_path, RANGE_SIZE):
+        start_vertices = edges[:, 0]
+        previous_vertex = run_vertices[-1][-1] if len(run_vertices[-1]) > 0 else start_vertices[0]
+        decreasing = np.flatnonzero(np.diff(start_vertices, prepend=previous_vertex) < 0)
+        if len(decreasing) > 0:
+            line = number_of_edges + int(decreasing[0]) + 1
+            raise ValueError(f'{graph_path} is not sorted by start vertex, start vertex {start_vertices[decreasing[0]]} '
+                             f'on line {line} comes after a larger one. Sort it first or use the numpy engine.')
+
+        run_starts = np.flatnonzero(np.diff(start_vertices, prepend=start_vertices[0] - 1))
+        block_run_lengths = np.diff(np.append(run_starts, len(edges)))
+        # A run that continues from the previous block
+        if start_vertices[0] == previous_vertex and len(run_vertices[-1]) > 0:
+            run_lengths[-1][-1] += block_run_lengths[0]
+            run_starts = run_starts[1:]
+            block_run_lengths = block_run_lengths[1:]
+
+        run_vertices.append(start_vertices[run_starts])
+        run_lengths.append(block_run_lengths)
+
+        block_vertices, counts = np.unique(edges, return_counts=True)
+        vertices, indices = np.unique(np.concatenate([vertices, block_vertices]), return_inverse=True)
+        degrees = np.bincount(indices, weights=np.concatenate([degrees, counts])).astype(np.int64)
+        number_of_edges += len(edges)
+
+    return np.concatenate(run_vertices), np.concatenate(run_lengths), vertices, degrees, number_of_edges
+
+
+def assign_runs(run_degrees: np.ndarray, number_of_edges: int, number_of_partitions: int) -> List[int]:
+    """
+    Cuts the graph between runs, so every partition gets about the same number of edges once the reversed edges are
+    added. A run is never split, all edges of a start vertex are in the same partition.
+
+    :param run_degrees: Degree of the start vertex of every run
+    :return: Partition of every run
+    """
+
+    partition_size = number_of_edges * 2 // number_of_partitions
+    assignment = []
+    partition = 0
+    size = 0
+
+    for degree in run_degrees.tolist():
+        if partition < number_of_partitions - 1 and size > 0 and size + degree >= partition_size:
+            partition += 1
+            size = 0
+
+        assignment.append(partition)
+        size += degree
+
+    return assignment
+
+
+def split_graph(graph_path: str, sub_graph_paths: List[str]) -> List[MetaData]:
+    """
+    Splits a graph that is sorted by start vertex into sub graphs with consecutive start vertices and adds the
+    reversed edges, in two passes over the graph. The first pass counts the degrees, the second writes every edge
+    and its reverse. The sub graphs are then sorted with `sort_file`, so they do not need to fit in memory.
+
+    :param graph_path: Path to the graph, one edge per line
+    :param sub_graph_paths: Path to write the sub graph of every worker to
+    :return: Meta data of every sub graph, fewer than `sub_graph_paths` if the graph has fewer start vertices
+    """
+
+    run_vertices, run_lengths, vertices, degrees, number_of_edges = read_runs(graph_path)
+    assignment = assign_runs(degrees[np.searchsorted(vertices, run_vertices)], number_of_edges, len(sub_graph_paths))
+    number_of_partitions = assignment[-1] + 1 if assignment else 0
+
+    all_meta_data = [MetaData(worker_id=worker_id, number_of_edges=0, min_vertex=None, max_vertex=None)
+                     for worker_id in range(number_of_partitions)]
+    for vertex, length, worker_id in zip(run_vertices.tolist(), run_lengths.tolist(), assignment):
+        meta_data = all_meta_data[worker_id]
+        if meta_data.min_vertex is None:
+            meta_data.min_vertex = vertex
+        meta_data.max_vertex = vertex
+        meta_data.number_of_edges += length
+
+    # Reversed edges go to the worker with their start vertex in its range, or the closest range below it
+    combined_meta_data = CombinedMetaData(all_meta_data)
+    reversed_min_vertices = np.array([meta_data.min_vertex for meta_data in all_meta_data], dtype=np.int64)
+    reversed_max_vertices = np.array([meta_data.max_vertex for meta_data in all_meta_data], dtype=np.int64)
+    reversed_numbers_of_edges = np.zeros(number_of_partitions, dtype=np.int64)
+    numbers_of_cut_edges = np.zeros(number_of_partitions, dtype=np.int64)
+
+    files = [open(path, 'w', buffering=BUFFER_SIZE) for path in sub_graph_paths[:number_of_partitions]]
+    try:
+        runs = iter(assignment)
+        last_start_vertex = None
+        forward_file = None
+
+        with open(graph_path, 'r') as f:
+            for lines in iter(lambda: list(islice(f, ROUTING_BLOCK_SIZE)), []):
+                edges = [line.split() for line in lines]
+                vertices = np.array([int(edge[1]) for edge in edges], dtype=np.int64)
+                worker_ids = combined_meta_data.get_worker_ids_that_have_vertices(vertices, strict=False)
+                start_vertices = [int(edge[0]) for edge in edges]
+                start_worker_ids = combined_meta_data.get_worker_ids_that_have_vertices(
+                    np.array(start_vertices, dtype=np.int64), strict=False)
+
+                for edge, start_vertex, worker_id in zip(edges, start_vertices, worker_ids.tolist()):
+                    if start_vertex != last_start_vertex:
+                        forward_file = files[next(runs)]
+                        last_start_vertex = start_vertex
+
+                    forward_file.write(f'{edge[0]} {edge[1]}\n')
+                    files[worker_id].write(f'{edge[1]} {edge[0]}\n')
+
+                reversed_numbers_of_edges += np.bincount(worker_ids, minlength=number_of_partitions)
+                np.minimum.at(reversed_min_vertices, worker_ids, vertices)
+                np.maximum.at(reversed_max_vertices, worker_ids, vertices)
+                numbers_of_cut_edges += count_cut_edges(start_worker_ids, worker_ids, number_of_partitions)
+                numbers_of_cut_edges += count_cut_edges(worker_ids, start_worker_ids, number_of_partitions)
+    finally:
+        for file in files:
+            file.close()
+
+    for worker_id, meta_data in enumerate(all_meta_data):
+        meta_data.number_of_edges += int(reversed_numbers_of_edges[worker_id])
+        meta_data.min_vertex = int(reversed_min_vertices[worker_id])
+        meta_data.max_vertex = int(reversed_max_vertices[worker_id])
+        meta_data.number_of_cut_edges = int(numbers_of_cut_edges[worker_id])
+        meta_data.content_hash = sort_file(sub_graph_paths[worker_id])
+
+    return all_meta_data
+
+
+def split_graph_in_memory(graph_path: str, sub_graph_paths: List[str]) -> List[MetaData]:
+    """
+    Splits a graph into sub graphs with consecutive start vertices and adds the reversed edges, with the whole graph
+    in memory as an array. The graph does not need to be sorted, the sub graphs are sorted.
+
+    :param graph_path: Path to the graph, one edge per line
+    :param sub_graph_paths: Path to write the sub graph of every worker to
+    :return: Meta data of every sub graph, fewer than `sub_graph_paths` if the graph has fewer start vertices
+    """
+
+    edges = sort_edges(add_reversed_edges(read_edges_as_array(graph_path)))
+
+    if len(edges) == 0:
+        return []
+
+    # With the edges sorted, the first edge of a start vertex is at the total degree of the vertices before it
+    vertex_starts = np.flatnonzero(np.diff(edges[:, 0], prepend=edges[0, 0] - 1))
+    cuts = vertex_starts[get_cuts(vertex_starts, len(edges), len(sub_graph_paths))]
+    bounds = np.concatenate([[0], cuts, [len(edges)]])
+
+    cut_vertices = edges[cuts, 0]
+    numbers_of_cut_edges = count_cut_edges(np.searchsorted(cut_vertices, edges[:, 0], side='right'),
+                                           np.searchsorted(cut_vertices, edges[:, 1], side='right'), len(bounds) - 1)
+
+    return [
+        write_sub_graph(worker_id, sub_graph_paths[worker_id], edges[start:end], int(numbers_of_cut_edges[worker_id]))
+        for worker_id, (start, end) in enumerate(zip(bounds[:-1], bounds[1:]))
+    ]
+
+
+def add_reversed_edges(edges: np.ndarray) -> np.ndarray:
+    return np.concatenate([edges, edges[:, ::-1]])
+
+
+def get_cuts(vertex_starts: np.ndarray, number_of_edges: int, number_of_partitions: int) -> np.ndarray:
+    """
+    :param vertex_starts: Total degree of the vertices before every vertex, in the order of the vertices
+    :param number_of_edges: Total degree of all vertices
+    :param number_of_partitions: Maximum number of partitions
+    :return: Index of the first vertex of every partition but the first, every partition gets about the same degree
+    """
+
+    partition_sizes = number_of_edges * np.arange(1, number_of_partitions) // number_of_partitions
+    cuts = np.minimum(np.searchsorted(vertex_starts, partition_sizes), len(vertex_starts) - 1)
+
+    return np.unique(cuts[cuts > 0])
+
+
+def count_cut_edges(start_worker_ids: np.ndarray, end_worker_ids: np.ndarray, number_of_partitions: int) -> np.ndarray:
+    """
+    :param start_worker_ids: Worker of the start vertex of every edge
+    :param end_worker_ids: Worker of the end vertex of every edge
+    :return: Number of edges to a vertex of another worker, for every worker
+    """
+
+    return np.bincount(start_worker_ids[start_worker_ids != end_worker_ids], minlength=number_of_partitions)
+
+
+def write_sub_graph(worker_id: int, path: str, edges: np.ndarray, number_of_cut_edges: int = 0) -> MetaData:
+    """
+    :param edges: Sorted edges of the sub graph
+    :return: Meta data of the sub graph
+    """
+
+    content_hash = write_edges(path, edges)
+
+    return MetaData(
+        worker_id=worker_id,
+        number_of_edges=len(edges),
+        min_vertex=int(edges[0, 0]),
+        max_vertex=int(edges[-1, 0]),
+        number_of_cut_edges=number_of_cut_edges,
+        content_hash=content_hash
+    )
+
+
+def get_edge_cut_ratio(all_meta_data: List[MetaData]) -> float:
+    """
+    :return: Part of the edges of which the vertices are on different workers
+    """
+
+    number_of_edges = sum(meta_data.number_of_edges for meta_data in all_meta_data)
+    if number_of_edges == 0:
+        return 0.0
+
+    return sum(meta_data.number_of_cut_edges for meta_data in all_meta_data) / number_of_edges
+
+
+def get_byte_ranges(graph_path: str, number_of_ranges: int) -> [(int, int)]:
+    """
+    :return: Start and end of about `number_of_ranges` parts of the graph, which all end after a newline
+    """
+
+    size = os.path.getsize(graph_path)
+    if size == 0:
+        return []
+
+    with open(graph_path, 'rb') as f, mmap(f.fileno(), 0, access=ACCESS_READ) as data:
+        ends = []
+        for part in range(1, number_of_ranges):
+            newline = data.find(b'\n', max(size * part // number_of_ranges, ends[-1] if ends else 0))
+            if newline == -1:
+                break
+            ends.append(newline + 1)
+
+    ends.append(size)
+    starts = [0] + ends[:-1]
+
+    return [(start, end) for start, end in zip(starts, ends) if start < end]
+
+
+def read_byte_range(graph_path: str, start: int, end: int) -> np.ndarray:
+    with open(graph_path, 'rb') as f, mmap(f.fileno(), 0, access=ACCESS_READ) as data:
+        return parse_edges(data[start:end])
+
+
+def count_degrees(graph_path: str, start: int, end: int) -> (np.ndarray, np.ndarray):
+    """
+    :return: Vertices in a part of the graph and their degrees in that part
+    """
+
+    return np.unique(read_byte_range(graph_path, start, end), return_counts=True)
+
+
+def write_buckets(graph_path: str, start: int, end: int, cut_vertices: np.ndarray,
+                  bucket_paths: List[str]) -> np.ndarray:
+    """
+    Writes the edges in a part of the graph and their reverse to the bucket of the sub graph of their start vertex,
+    as pairs of int64
+
+    :param cut_vertices: First vertex of every sub graph but the first
+    :param bucket_paths: Path of the bucket of every sub graph
+    :return: Number of edges in the buckets of every sub graph to a vertex of another sub graph
+    """
+
+    edges = add_reversed_edges(read_byte_range(graph_path, start, end))
+    worker_ids = np.searchsorted(cut_vertices, edges[:, 0], side='right')
+    numbers_of_cut_edges = count_cut_edges(worker_ids, np.searchsorted(cut_vertices, edges[:, 1], side='right'),
+                                           len(bucket_paths))
+
+    edges = edges[np.argsort(worker_ids, kind='stable')]
+    bounds = np.concatenate([[0], np.cumsum(np.bincount(worker_ids, minlength=len(bucket_paths)))])
+    for worker_id, path in enumerate(bucket_paths):
+        edges[bounds[worker_id]:bounds[worker_id + 1]].tofile(path)
+
+    return numbers_of_cut_edges
+
+
+def merge_buckets(worker_id: int, bucket_paths: List[str], sub_graph_path: str, number_of_cut_edges: int) -> MetaData:
+    edges = np.concatenate([np.fromfile(path, dtype=np.int64).reshape(-1, 2) for path in bucket_paths])
+
+    return write_sub_graph(worker_id, sub_graph_path, sort_edges(edges), number_of_cut_edges)
+
+
+def split_graph_in_parallel(graph_path: str, sub_graph_paths: List[str]) -> List[MetaData]:
+    """
+    Splits a graph into sub graphs with consecutive start vertices and adds the reversed edges, like
+    `split_graph_in_memory`, with a pool of processes. The graph is cut into parts at newlines, which the processes
+    parse twice: once to count the degrees, from which the sub graphs are cut, and once to write every edge and its
+    reverse into a bucket per sub graph. The processes then merge and sort the buckets of a sub graph each.
+
+    :param graph_path: Path to the graph, one edge per line
+    :param sub_graph_paths: Path to write the sub graph of every worker to
+    :return: Meta data of every sub graph, fewer than `sub_graph_paths` if the graph has fewer start vertices
+    """
+
+    number_of_processes = processes or os.cpu_count()
+    number_of_ranges = max(number_of_processes, -(-os.path.getsize(graph_path) // RANGE_SIZE))
+    byte_ranges = get_byte_ranges(graph_path, number_of_ranges)
+
+    with Pool(number_of_processes) as pool, TemporaryDirectory(prefix='scaler-partitioning-') as directory:
+        range_degrees = pool.starmap(count_degrees, [(graph_path, start, end) for start, end in byte_ranges])
+        if sum(len(vertices) for vertices, _ in range_degrees) == 0:
+            return []
+
+        vertices, indices = np.unique(np.concatenate([vertices for vertices, _ in range_degrees]),
+                                      return_inverse=True)
+        degrees = np.bincount(indices, weights=np.concatenate([counts for _, counts in range_degrees]))
+        vertex_starts = np.cumsum(degrees) - degrees
+        cut_vertices = vertices[get_cuts(vertex_starts, int(degrees.sum()), len(sub_graph_paths))]
+        number_of_partitions = len(cut_vertices) + 1
+
+        bucket_paths = [
+            [os.path.join(directory, f'{range_id}-{worker_id}.edges') for worker_id in range(number_of_partitions)]
+            for range_id in range(len(byte_ranges))
+        ]
+        numbers_of_cut_edges = sum(pool.starmap(write_buckets, [
+            (graph_path, start, end, cut_vertices, bucket_paths[range_id])
+            for range_id, (start, end) in enumerate(byte_ranges)
+        ]))
+
+        return pool.starmap(merge_buckets, [
+            (worker_id, [paths[worker_id] for paths in bucket_paths], sub_graph_paths[worker_id],
+             int(numbers_of_cut_edges[worker_id]))
+            for worker_id in range(number_of_partitions)
+        ])
+
+
+def choose_partition(counts: List[int], loads: List[int], capacity: float) -> int:
+    """
+    :param counts: Number of neighbours of a vertex in every partition
+    :param loads: Degree of the vertices in every partition
+    :param capacity: Degree a partition may get
+    :return: The partition with most of the neighbours, weighted by how much room it has left, the partition with
+        the lowest degree on a tie
+    """
+
+    best_partition = 0
+    best_score = counts[0] * (1 - loads[0] / capacity)
+
+    for partition in range(1, len(loads)):
+        score = counts[partition] * (1 - loads[partition] / capacity)
+        if score > best_score or (score == best_score and loads[partition] < loads[best_partition]):
+            best_partition = partition
+            best_score = score
+
+    return best_partition
+
+
+def assign_vertices(neighbours: np.ndarray, offsets: np.ndarray, number_of_partitions: int) -> np.ndarray:
+    """
+    Linear deterministic greedy: every vertex in turn goes to the partition with most of its neighbours so far, see
+    `choose_partition`. The loads and the partitions are kept in lists, so a vertex costs a few operations per
+    neighbour and per partition.
+
+    :param neighbours: Neighbours of all vertices, those of vertex v are `neighbours[offsets[v]:offsets[v + 1]]`
+    :param offsets: Start of the neighbours of every vertex and the number of neighbours at the end
+    :return: Partition of every vertex
+    """
+
+    capacity = GREEDY_CAPACITY * int(offsets[-1]) / number_of_partitions
+    partitions = [-1] * (len(offsets) - 1)
+    loads = [0] * number_of_partitions
+    offsets = offsets.tolist()
+
+    for vertex, (start, end) in enumerate(zip(offsets, offsets[1:])):
+        counts = [0] * number_of_partitions
+        for neighbour in neighbours[start:end].tolist():
+            partition = partitions[neighbour]
+            if partition >= 0:
+                counts[partition] += 1
+
+        partition = choose_partition(counts, loads, capacity)
+        partitions[vertex] = partition
+        loads[partition] += end - start
+
+    return np.array(partitions, dtype=np.int64)
+
+
+def assign_vertices_in_stream(graph_path: str, vertices: np.ndarray, degrees: np.ndarray, number_of_edges: int,
+                              number_of_partitions: int) -> np.ndarray:
+    """
+    Linear deterministic greedy like `assign_vertices`, over a graph that is sorted by start vertex. A start vertex
+    is assigned with the edges of its run, the partitions of its end vertices and the votes of the vertices that
+    pointed to it before. Vertices that are never a start vertex are assigned with their votes at the end. The
+    vertices are numbered by their index in `vertices`, the votes take 4 bytes per vertex and partition.
+
+    :param vertices: Every vertex in increasing order, see `read_runs`
+    :param degrees: Degree of every vertex
+    :return: Partition of every vertex in `vertices`
+    """
+
+    capacity = GREEDY_CAPACITY * 2 * number_of_edges / number_of_partitions
+    partitions = [-1] * len(vertices)
+    loads = [0] * number_of_partitions
+    degrees = degrees.tolist()
+    # Number of neighbours in every partition of the vertices that have not been assigned yet
+    votes = np.zeros((len(vertices), number_of_partitions), dtype=np.int32)
+
+    def assign(vertex: int, counts: List[int], end_vertices: List[int]):
+        partition = choose_partition(counts, loads, capacity)
+        partitions[vertex] = partition
+        loads[partition] += degrees[vertex]
+
+        for end_vertex in end_vertices:
+            if partitions[end_vertex] < 0:
+                votes[end_vertex, partition] += 1
+
+    def assign_run(vertex: int, end_vertices: List[int]):
+        counts = votes[vertex].tolist()
+        for end_vertex in end_vertices:
+            partition = partitions[end_vertex]
+            if partition >= 0:
+                counts[partition] += 1
+
+        assign(vertex, counts, end_vertices)
+
+    run_vertex = -1
+    run = []
+    for edges in read_edge_blocks(graph_path, GREEDY_BLOCK_SIZE):
+        edges = np.searchsorted(vertices, edges)
+        run_starts = np.flatnonzero(np.diff(edges[:, 0], prepend=edges[0, 0] - 1)).tolist()
+        start_vertices = edges[:, 0].tolist()
+        end_vertices = edges[:, 1].tolist()
+
+        for start, end in zip(run_starts, run_starts[1:] + [len(edges)]):
+            vertex = start_vertices[start]
+            if vertex != run_vertex:
+                if vertex < run_vertex:
+                    raise ValueError(f'{graph_path} is not sorted by start vertex, start vertex {vertices[vertex]} '
+                                     f'comes after {vertices[run_vertex]}')
+                if run_vertex >= 0:
+                    assign_run(run_vertex, run)
+                run_vertex = vertex
+                run = []
+
+            run += end_vertices[start:end]
+
+    if run_vertex >= 0:
+        assign_run(run_vertex, run)
+
+    for vertex in range(len(vertices)):
+        if partitions[vertex] < 0:
+            assign(vertex, votes[vertex].tolist(), [])
+
+    return np.array(partitions, dtype=np.int64)
+
+
+def number_vertices(partitions: np.ndarray) -> (np.ndarray, np.ndarray):
+    """
+    :param partitions: Partition of every vertex
+    :return: Vertices in the order of their new numbers, so that the vertices of every partition are consecutive,
+        and the partition of every number. Partitions without vertices are dropped.
+    """
+
+    partitions = np.unique(partitions, return_inverse=True)[1].reshape(-1)
+    order = np.argsort(partitions, kind='stable')
+
+    return order, partitions[order]
+
+
+def split_graph_greedy(graph_path: str, sub_graph_paths: List[str]) -> (List[MetaData], np.ndarray):
+    """
+    Splits a graph that is sorted by start vertex into sub graphs with few edges between them and adds the reversed
+    edges, in three passes over the graph. The first pass counts the degrees, the second assigns the vertices with
+    `assign_vertices_in_stream` and the third writes every edge and its reverse with the vertices numbered again, so
+    that the vertices of every sub graph are consecutive. The workers find the worker of a vertex by its range like
+    with the other strategies, the labels map the numbers back.
+
+    :param graph_path: Path to the graph, one edge per line
+    :param sub_graph_paths: Path to write the sub graph of every worker to
+    :return: Meta data of every sub graph, fewer than `sub_graph_paths` if the graph has fewer vertices, and the
+        original label of every vertex in the sub graphs
+    """
+
+    _, _, vertices, degrees, number_of_edges = read_runs(graph_path)
+    if number_of_edges == 0:
+        return [], np.empty(0, dtype=np.int64)
+
+    labels = vertices
+    order, partitions = number_vertices(
+        assign_vertices_in_stream(graph_path, vertices, degrees, number_of_edges, len(sub_graph_paths)))
+    numbers = np.empty(len(labels), dtype=np.int64)
+    numbers[order] = np.arange(len(labels))
+    number_of_partitions = int(partitions[-1]) + 1
+
+    numbers_of_edges = np.zeros(number_of_partitions, dtype=np.int64)
+    numbers_of_cut_edges = np.zeros(number_of_partitions, dtype=np.int64)
+    files = [open(path, 'wb', buffering=BUFFER_SIZE) for path in sub_graph_paths[:number_of_partitions]]
+    try:
+        for edges in read_edge_blocks(graph_path, RANGE_SIZE):
+            edges = numbers[np.searchsorted(labels, add_reversed_edges(edges))]
+            worker_ids = partitions[edges]
+            numbers_of_cut_edges += count_cut_edges(worker_ids[:, 0], worker_ids[:, 1], number_of_partitions)
+
+            edges = edges[np.argsort(worker_ids[:, 0], kind='stable')]
+            block_numbers_of_edges = np.bincount(worker_ids[:, 0], minlength=number_of_partitions)
+            bounds = np.concatenate([[0], np.cumsum(block_numbers_of_edges)])
+            for worker_id, file in enumerate(files):
+                file.write(format_edges(edges[bounds[worker_id]:bounds[worker_id + 1]]))
+
+            numbers_of_edges += block_numbers_of_edges
+    finally:
+        for file in files:
+            file.close()
+
+    # Every vertex is a start vertex once the reversed edges are added
+    bounds = np.concatenate([[0], np.cumsum(np.bincount(partitions))])
+    all_meta_data = []
+    for worker_id in range(number_of_partitions):
+        all_meta_data.append(MetaData(
+            worker_id=worker_id,
+            number_of_edges=int(numbers_of_edges[worker_id]),
+            min_vertex=int(bounds[worker_id]),
+            max_vertex=int(bounds[worker_id + 1] - 1),
+            number_of_cut_edges=int(numbers_of_cut_edges[worker_id]),
+            content_hash=sort_file(sub_graph_paths[worker_id])
+        ))
+
+    return all_meta_data, labels[order]
+
+
+def split_graph_greedy_in_memory(graph_path: str, sub_graph_paths: List[str]) -> (List[MetaData], np.ndarray):
+    """
+    Splits a graph into sub graphs with few edges between them and adds the reversed edges like `split_graph_greedy`,
+    with the whole graph in memory. The graph does not need to be sorted.
+
+    :param graph_path: Path to the graph, one edge per line
+    :param sub_graph_paths: Path to write the sub graph of every worker to
+    :return: Meta data of every sub graph, fewer than `sub_graph_paths` if the graph has fewer vertices, and the
+        original label of every vertex in the sub graphs
+    """
+
+    labels, vertices = np.unique(read_edges_as_array(graph_path), return_inverse=True)
+    edges = sort_edges(add_reversed_edges(vertices.reshape(-1, 2)))
+
+    if len(edges) == 0:
+        return [], labels
+
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(edges[:, 0], minlength=len(labels)))])
+    order, partitions = number_vertices(assign_vertices(edges[:, 1], offsets, len(sub_graph_paths)))
+
+    numbers = np.empty(len(labels), dtype=np.int64)
+    numbers[order] = np.arange(len(labels))
+    edges = sort_edges(numbers[edges])
+
+    number_of_partitions = partitions.max() + 1
+    numbers_of_cut_edges = count_cut_edges(partitions[edges[:, 0]], partitions[edges[:, 1]], number_of_partitions)
+    bounds = np.searchsorted(edges[:, 0], np.concatenate([[0], np.cumsum(np.bincount(partitions))]))
+
+    all_meta_data = [
+        write_sub_graph(worker_id, sub_graph_paths[worker_id], edges[start:end], int(numbers_of_cut_edges[worker_id]))
+        for worker_id, (start, end) in enumerate(zip(bounds[:-1], bounds[1:]))
+    ]
+
+    return all_meta_data, labels[order]
+
+
+def restore_labels(lines: List[str], labels: np.ndarray) -> List[str]:
+    """
+    :param lines: Edges with the numbers of the vertices of `split_graph_greedy`
+    :param labels: Original label of every vertex
+    :return: The edges with the original labels
+    """
+
+    edges = parse_edges(''.join(lines))
+
+    return format_edges(labels[edges]).decode().splitlines(keepends=True)
@@ -1,22 +1,291 @@
+import asyncio
+import struct
+from collections import deque
 from multiprocessing import Process, Queue
+from queue import Empty
+from threading import Thread, Event
+from time import time
 from lab.util import message
 from lab.util import sockets
-from json.decoder import JSONDecodeError
+
+PROCESS = 'process'
+ASYNCIO = 'asyncio'
+
+# Mode of the servers started by this process. A separate process reads the sockets even while the node is busy,
+# with ASYNCIO they are only read while the node waits for messages
+mode = PROCESS
+
+
+def set_mode(name: str):
+    global mode
+    mode = name
+
+
+CONTROL = 'control'
+DATA = 'data'
+
+# Seconds between checks for new control messages while received messages are waiting
+RECEIVE_INTERVAL = 0.001
+
+
+class MessageLanes:
+    """ Keeps received control and data messages apart, so a control message never waits behind bulk data such as
+    file chunks. Within a lane messages keep their order.
+    """
+
+    def __init__(self):
+        self.lanes = {
+            CONTROL: deque(),
+            DATA: deque()
+        }
+        self.max_depths = {
+            CONTROL: 0,
+            DATA: 0
+        }
+
+    def __len__(self):
+        return len(self.lanes[CONTROL]) + len(self.lanes[DATA])
+
+    @staticmethod
+    def get_lane(received_message: bytes) -> str:
+        try:
+            status = message.peek_status(received_message)
+        except (ValueError, struct.error):
+            # Let the decoder deal with it
+            return CONTROL
+
+        return DATA if status in message.DATA_STATUSES else CONTROL
+
+    def append(self, received_message: bytes):
+        lane = self.get_lane(received_message)
+        self.lanes[lane].append(received_message)
+        self.max_depths[lane] = max(self.max_depths[lane], len(self.lanes[lane]))
+
+    def popleft(self) -> bytes:
+        if len(self.lanes[CONTROL]) > 0:
+            return self.lanes[CONTROL].popleft()
+
+        return self.lanes[DATA].popleft()
+
+    def get_depths(self) -> dict:
+        """
+        :return: Number of messages waiting and the maximum so far, per lane
+        """
+
+        return {
+            lane: {'depth': len(messages), 'max_depth': self.max_depths[lane]}
+            for lane, messages in self.lanes.items()
+        }
 
 
 class ServerProcess:
-    def __init__(self, queue: Queue):
+    def __init__(self, queue: Queue, socket_dir: str or None):
         self.socket = sockets.bind("", 0)
         self.queue = queue
-        queue.put([sockets.get_hostname(), sockets.get_port(self.socket)])
-        self.listen()
+        port = sockets.get_port(self.socket)
+
+        sockets.set_socket_dir(socket_dir)
+        socket_path = sockets.get_unix_socket_path(port)
+        if socket_path is not None:
+            Thread(target=self.listen, args=(sockets.bind_unix(socket_path),), daemon=True).start()
+
+        queue.put([sockets.get_hostname(), port, socket_path])
+        self.listen(self.socket)
 
     def put_message_in_queue(self, message):
         self.queue.put_nowait(message)
 
-    def listen(self):
+    def read_connection(self, client_socket):
+        try:
+            for received_message in sockets.get_messages(client_socket):
+                self.put_message_in_queue(received_message)
+        except (OSError, sockets.FrameTooLarge):
+            client_socket.close()
+
+    def listen(self, server_socket):
         while True:
-            self.put_message_in_queue(sockets.get_message(self.socket))
+            client_socket, addr = server_socket.accept()
+
+            # Peers keep their connection open, so read every connection in its own thread
+            Thread(target=self.read_connection, args=(client_socket,), daemon=True).start()
+
+
+class ProcessServer:
+    """ Receives messages in a separate ServerProcess, which passes them on through a multiprocessing queue
+    """
+
+    def __init__(self):
+        # Create queue
+        self.queue = Queue()
+        self.messages = MessageLanes()
+        self.received_at = 0
+
+        # Start server with queue
+        self.process = Process(target=ServerProcess, args=(self.queue, sockets.socket_dir))
+        self.process.start()
+
+        # Wait for server to send its hostname, port and Unix domain socket
+        self.hostname, self.port, self.socket_path = self.queue.get()
+
+    def receive(self):
+        """
+        Moves the messages that have arrived in the queue into their lanes
+        """
+
+        while not self.queue.empty():
+            self.messages.append(self.queue.get())
+
+        self.received_at = time()
+
+    def get(self, timeout: float = None) -> bytes:
+        if len(self.messages) == 0:
+            self.messages.append(self.queue.get(timeout=timeout))
+            self.receive()
+        elif time() - self.received_at >= RECEIVE_INTERVAL:
+            # Control messages that arrived meanwhile go first
+            self.receive()
+
+        return self.messages.popleft()
+
+    def empty(self) -> bool:
+        return len(self.messages) == 0 and self.queue.empty()
+
+    def get_queue_depths(self) -> dict:
+        self.receive()
+
+        return self.messages.get_depths()
+
+    def terminate(self):
+        self.process.terminate()
+
+
+class MessageProtocol(asyncio.Protocol):
+    """ Splits the byte stream of a connection into frames, see `sockets.write_frame`
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.buffer = bytearray()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server.transports.add(transport)
+
+    def connection_lost(self, exc):
+        self.server.transports.discard(self.transport)
+
+    def data_received(self, data):
+        self.buffer += data
+
+        while len(self.buffer) >= sockets.FRAME_HEADER.size:
+            length, = sockets.FRAME_HEADER.unpack_from(self.buffer)
+            if length > sockets.MAX_FRAME_SIZE:
+                self.transport.close()
+                return
+
+            end = sockets.FRAME_HEADER.size + length
+            if len(self.buffer) < end:
+                return
+
+            with memoryview(self.buffer) as view:
+                self.server.put_message(bytes(view[sockets.FRAME_HEADER.size:end]))
+            del self.buffer[:end]
+
+
+class AsyncioServer:
+    """ Receives messages on an asyncio event loop in the current process. The loop only runs while messages
+    are requested, so handlers are never called concurrently with the rest of the node.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.messages = MessageLanes()
+        self.received_at = 0
+        self.transports = set()
+        self.waiter = None
+        self.terminated = False
+
+        server_socket = sockets.bind("", 0)
+        self.hostname = sockets.get_hostname()
+        self.port = sockets.get_port(server_socket)
+        self.servers = [self.loop.run_until_complete(
+            self.loop.create_server(lambda: MessageProtocol(self), sock=server_socket))]
+
+        self.socket_path = sockets.get_unix_socket_path(self.port)
+        if self.socket_path is not None:
+            self.servers.append(self.loop.run_until_complete(
+                self.loop.create_unix_server(lambda: MessageProtocol(self), sock=sockets.bind_unix(self.socket_path))))
+
+    def put_message(self, received_message: bytes):
+        self.messages.append(received_message)
+
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def wait_for_message(self, timeout: float = None):
+        if timeout == 0:
+            # Handle the connections that are ready without blocking
+            await asyncio.sleep(0)
+            return
+
+        self.waiter = self.loop.create_future()
+        try:
+            await asyncio.wait_for(self.waiter, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.waiter = None
+
+    def poll(self, timeout: float = None):
+        """
+        Runs the event loop until a message has been received
+
+        :param timeout: Maximum time to wait in seconds, None to wait indefinitely
+        """
+
+        if self.terminated:
+            # Nothing arrives anymore, block like a queue without producer
+            Event().wait(timeout)
+            return
+
+        self.loop.run_until_complete(self.wait_for_message(timeout))
+        self.received_at = time()
+
+    def get(self, timeout: float = None) -> bytes:
+        if len(self.messages) == 0:
+            self.poll(timeout)
+        elif time() - self.received_at >= RECEIVE_INTERVAL:
+            # Control messages that arrived meanwhile go first
+            self.poll(0)
+
+        if len(self.messages) == 0:
+            raise Empty()
+
+        return self.messages.popleft()
+
+    def empty(self) -> bool:
+        if len(self.messages) == 0:
+            self.poll(0)
+
+        return len(self.messages) == 0
+
+    def get_queue_depths(self) -> dict:
+        return self.messages.get_depths()
+
+    def terminate(self):
+        if self.terminated:
+            return
+
+        for server in self.servers:
+            server.close()
+        for transport in list(self.transports):
+            transport.close()
+
+        # Let the transports finish closing before the loop is closed
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.loop.close()
+        self.terminated = True
 
 
 class Server:
@@ -27,39 +296,75 @@ class Server:
     def re_init(self, *args):
         self.message_interface = {}
 
-        # Create queue
-        self.server_queue = Queue()
-
-        # Start server with queue
-        self.server = Process(target=ServerProcess, args=(self.server_queue,))
-        self.server.start()
+        if mode == ASYNCIO:
+            self.server = AsyncioServer()
+        else:
+            self.server = ProcessServer()
 
-        # Wait for server to send its hostname and port
-        self.hostname, self.port = self.server_queue.get()
+        self.hostname, self.port = self.server.hostname, self.server.port
+        self.socket_path = self.server.socket_path
         # if len(self.hostname) > 6 and self.hostname[-6:] == '.local':
         #     # Fix for MacOS
         #     self.hostname = self.hostname[:-6]
         #     print(self.hostname)
 
+    def handle_message(self, received_message: bytes):
+        try:
+            status, *args = message.read(received_message)
+        except message.DECODE_ERRORS:
+            return
+
+        assert status in self.message_interface.keys(), \
+            f'Unknown status {status}'
+        self.message_interface[status](*args)
+
     def handle_queue(self):
         while self.message_in_queue():
+            self.handle_message(self.server.get())
+
+    def wait_for_messages(self, predicate=None, timeout: float = None) -> bool:
+        """
+        Handles incoming messages until the predicate holds, blocks in between instead of polling
+
+        :param predicate: Function without arguments, None to return once the next messages are handled
+        :param timeout: Maximum time to wait in seconds, None to wait indefinitely
+        :return: Boolean whether the predicate holds, or whether a message was handled if there is no predicate
+        """
+
+        deadline = None if timeout is None else time() + timeout
+
+        while predicate is None or not predicate():
+            remaining = None if deadline is None else max(0.0, deadline - time())
+
             try:
-                status, *args = self.get_message_from_queue()
-                assert status in self.message_interface.keys(), \
-                    f'Unknown status {status}'
-                self.message_interface[status](*args)
-            except JSONDecodeError:
-                continue
+                received_message = self.server.get(timeout=remaining)
+            except Empty:
+                return predicate is not None and predicate()
+
+            self.handle_message(received_message)
+            self.handle_queue()
+
+            if predicate is None:
+                return True
+
+        return True
 
     def get_message_from_queue(self) -> [str]:
         """
         :return: List of the elements of the data in the queue
         """
-        return message.read(self.server_queue.get())
+        return message.read(self.server.get())
 
     def message_in_queue(self) -> bool:
         """
         :return: Boolean whether there are any messages in the queue
         """
 
-        return not self.server_queue.empty()
+        return not self.server.empty()
+
+    def get_queue_depths(self) -> dict:
+        """
+        :return: Number of received messages waiting to be handled and the maximum so far, per lane
+        """
+
+        return self.server.get_queue_depths()
@@ -0,0 +1,190 @@
+from multiprocessing import shared_memory, resource_tracker
+from typing import Dict, Tuple
+
+import numpy as np
+
+# Number of random walkers that fit in the ring between two workers
+RANDOM_WALKER_RING_CAPACITY = 4096
+
+
+def attach(name: str) -> shared_memory.SharedMemory:
+    """
+    Attaches to shared memory created by another process, without taking over its ownership
+
+    :param name: Name of the shared memory
+    :return: Shared memory
+    """
+
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        pass
+
+    # Before Python 3.13 every attached process would unlink the memory when it exits
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name)
+    finally:
+        resource_tracker.register = register
+
+
+class SharedArray:
+    """ Numpy array in shared memory, created by the master and attached to by the workers
+    """
+
+    def __init__(self, name: str, shape: tuple, create: bool = False):
+        size = int(np.prod(shape)) * np.dtype(np.int64).itemsize
+
+        if create:
+            # Shared memory can not be empty
+            self.memory = shared_memory.SharedMemory(name, create=True, size=max(size, 1))
+        else:
+            self.memory = attach(name)
+
+        self.owner = create
+        self.array = np.ndarray(shape, dtype=np.int64, buffer=self.memory.buf)
+
+    def close(self):
+        # The buffer can only be released without arrays that use it
+        del self.array
+        self.memory.close()
+
+        if self.owner:
+            self.memory.unlink()
+
+
+class SharedRing(SharedArray):
+    """ Queue of integers from a single producer to a single consumer. The producer only moves the tail and the
+    consumer only the head, so neither needs a lock. A value is written before the tail that publishes it.
+    """
+
+    HEAD = 0
+    TAIL = 1
+
+    def __init__(self, name: str, capacity: int, create: bool = False):
+        super().__init__(name, (capacity + 2,), create)
+        self.capacity = capacity
+        self.slots = self.array[2:]
+
+    def __len__(self):
+        return int(self.array[self.TAIL] - self.array[self.HEAD])
+
+    def push(self, values: list) -> int:
+        """
+        Appends as many values as fit in the ring
+
+        :param values: Values to append
+        :return: Number of values that were appended, the rest should be pushed again later
+        """
+
+        tail = int(self.array[self.TAIL])
+        number_of_values = min(len(values), self.capacity - (tail - int(self.array[self.HEAD])))
+
+        if number_of_values > 0:
+            # The values may wrap around the end of the slots
+            start = tail % self.capacity
+            first_part = min(number_of_values, self.capacity - start)
+            self.slots[start:start + first_part] = values[:first_part]
+            self.slots[:number_of_values - first_part] = values[first_part:number_of_values]
+
+            self.array[self.TAIL] = tail + number_of_values
+
+        return number_of_values
+
+    def pop_all(self) -> list:
+        """
+        :return: All values in the ring, oldest first
+        """
+
+        head = int(self.array[self.HEAD])
+        tail = int(self.array[self.TAIL])
+
+        if head == tail:
+            return []
+
+        start = head % self.capacity
+        first_part = min(tail - head, self.capacity - start)
+        values = self.slots[start:start + first_part].tolist() + self.slots[:tail - head - first_part].tolist()
+        self.array[self.HEAD] = tail
+
+        return values
+
+    def clear(self):
+        self.array[self.HEAD] = self.array[self.TAIL]
+
+    def close(self):
+        del self.slots
+        super().close()
+
+
+class SharedRun:
+    """ Shared memory of a run on a single host: the graph partition of every worker, a random walker ring for
+    every pair of workers and the progress counter of every worker. The master creates all of it, a worker only
+    attaches to its own partition and rings.
+    """
+
+    def __init__(self, prefix: str, number_of_workers: int):
+        self.prefix = prefix
+        self.number_of_workers = number_of_workers
+        self.graphs: Dict[int, SharedArray] = {}
+        self.rings: Dict[Tuple[int, int], SharedRing] = {}
+        self.progress: SharedArray = None
+
+    def get_graph_name(self, worker_id: int) -> str:
+        return f'{self.prefix}-graph-{worker_id}'
+
+    def get_ring_name(self, from_worker_id: int, to_worker_id: int) -> str:
+        return f'{self.prefix}-ring-{from_worker_id}-{to_worker_id}'
+
+    def get_progress_name(self) -> str:
+        return f'{self.prefix}-progress'
+
+    def create(self, edges: Dict[int, np.ndarray]):
+        """
+        Creates the shared memory of the run
+
+        :param edges: Edges of the partition of each worker, as an array of shape (number of edges, 2)
+        """
+
+        for worker_id, partition in edges.items():
+            self.graphs[worker_id] = SharedArray(self.get_graph_name(worker_id), partition.shape, create=True)
+            self.graphs[worker_id].array[:] = partition
+
+        for from_worker_id in range(self.number_of_workers):
+            for to_worker_id in range(self.number_of_workers):
+                if from_worker_id != to_worker_id:
+                    self.rings[(from_worker_id, to_worker_id)] = SharedRing(
+                        self.get_ring_name(from_worker_id, to_worker_id), RANDOM_WALKER_RING_CAPACITY, create=True)
+
+        self.progress = SharedArray(self.get_progress_name(), (self.number_of_workers,), create=True)
+        self.progress.array[:] = 0
+
+    def attach(self, worker_id: int, number_of_edges: int):
+        """
+        Attaches to the partition and the rings of a worker
+
+        :param worker_id: Id of the worker
+        :param number_of_edges: Number of edges in the partition of the worker
+        """
+
+        self.graphs[worker_id] = SharedArray(self.get_graph_name(worker_id), (number_of_edges, 2))
+
+        for other_worker_id in range(self.number_of_workers):
+            if other_worker_id != worker_id:
+                for key in [(worker_id, other_worker_id), (other_worker_id, worker_id)]:
+                    self.rings[key] = SharedRing(self.get_ring_name(*key), RANDOM_WALKER_RING_CAPACITY)
+
+        self.progress = SharedArray(self.get_progress_name(), (self.number_of_workers,))
+
+    def get_incoming_rings(self, worker_id: int) -> [SharedRing]:
+        return [ring for (from_worker_id, to_worker_id), ring in self.rings.items() if to_worker_id == worker_id]
+
+    def close(self):
+        for shared_array in [*self.graphs.values(), *self.rings.values(), self.progress]:
+            if shared_array is not None:
+                shared_array.close()
+
+        self.graphs = {}
+        self.rings = {}
+        self.progress = None
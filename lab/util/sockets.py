@@ -1,4 +1,132 @@
+import os
 import socket
+import struct
+from select import select
+from threading import Lock
+
+
+class Connection:
+    """ Long-lived outgoing connection to a single (host, port)
+    """
+
+    def __init__(self, host, port):
+        self.socket = connect(host, port)
+        self.lock = Lock()
+
+    def is_stale(self) -> bool:
+        """
+        Servers never write back on a connection, so a readable socket means
+        the peer closed it (e.g. because it restarted)
+
+        :return: Boolean whether the connection can no longer be used
+        """
+
+        readable, _, _ = select([self.socket], [], [], 0)
+
+        return len(readable) > 0
+
+    def send(self, message: bytes):
+        with self.lock:
+            self.socket.sendall(message)
+
+    def close(self):
+        self.socket.close()
+
+
+class ConnectionPool:
+    """ Keeps one connection open per (host, port), so messages do not pay for
+    a TCP handshake each
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.connections = {}
+        self.pid = os.getpid()
+
+    def get_connection(self, host, port) -> Connection:
+        with self.lock:
+            # Connections inherited from a parent process are owned by the parent
+            if self.pid != os.getpid():
+                self.connections = {}
+                self.pid = os.getpid()
+
+            connection = self.connections.get((host, port))
+
+            if connection is not None and connection.is_stale():
+                del self.connections[(host, port)]
+                connection.close()
+                connection = None
+
+            if connection is None:
+                connection = Connection(host, port)
+                self.connections[(host, port)] = connection
+
+            return connection
+
+    def close_connection(self, host, port):
+        with self.lock:
+            connection = self.connections.pop((host, port), None)
+
+        if connection is not None:
+            connection.close()
+
+    def send_message(self, host, port, message: bytes):
+        connection = self.get_connection(host, port)
+
+        try:
+            connection.send(message)
+        except OSError:
+            # Peer went away since the last message, reconnect once
+            self.close_connection(host, port)
+            self.get_connection(host, port).send(message)
+
+
+connection_pool = ConnectionPool()
+
+# Every message is preceded by its length as a 4 byte unsigned int
+FRAME_HEADER = struct.Struct('!I')
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+
+class FrameTooLarge(Exception):
+    pass
+
+
+# Directory of the Unix domain sockets of this run, None to only use TCP
+socket_dir = None
+
+# Unix domain socket of each (host, port) on this host
+unix_socket_paths = {}
+
+
+def set_socket_dir(path: str or None):
+    global socket_dir
+    socket_dir = path
+
+
+def get_unix_socket_path(port) -> str or None:
+    """
+    :param port: TCP port of a server on this host
+    :return: Path of the Unix domain socket next to the TCP port, None if Unix domain sockets are not used
+    """
+
+    if socket_dir is None:
+        return None
+
+    return os.path.join(socket_dir, f'{port}.sock')
+
+
+def register_unix_socket(host, port, path: str or None):
+    """
+    Connects to (host, port) over its Unix domain socket from now on, if it runs on this host
+
+    :param host: Host of the server
+    :param port: TCP port of the server
+    :param path: Path of the Unix domain socket of the server, None if it has none
+    """
+
+    if path is not None and host == get_hostname():
+        unix_socket_paths[(host, port)] = path
 
 
 def get_hostname():
@@ -6,7 +134,7 @@ def get_hostname():
 
 
 def get_port(s):
-    s.listen(1)
+    s.listen(128)
     port = s.getsockname()[1]
 
     return port
@@ -19,25 +147,89 @@ def bind(host, port):
     return s
 
 
+def bind_unix(path):
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.bind(path)
+    s.listen(128)
+
+    return s
+
+
 def connect(host, port):
+    path = unix_socket_paths.get((host, port))
+    if path is not None:
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            s.connect(path)
+        except FileNotFoundError:
+            # The run directory has been removed, like a port that is no longer open
+            s.close()
+            raise ConnectionRefusedError(f'Unix domain socket {path} no longer exists')
+
+        return s
+
     s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     s.connect((host, port))
+    s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
 
     return s
 
 
-def get_message(s):
-    client_socket, addr = s.accept()
-    message = client_socket.recv(1024)
-    client_socket.close()
+def write_frame(message: bytes) -> bytes:
+    if len(message) > MAX_FRAME_SIZE:
+        raise FrameTooLarge(f'Message of {len(message)} bytes exceeds the maximum frame size of {MAX_FRAME_SIZE}')
+
+    return FRAME_HEADER.pack(len(message)) + message
+
+
+def read_frame(f) -> bytes or None:
+    """
+    Reads one complete frame from a buffered connection
+
+    :param f: File object of the connection, opened with `makefile('rb')`
+    :return: Message as bytes, None if the peer closed the connection
+    """
+
+    header = f.read(FRAME_HEADER.size)
+    if len(header) < FRAME_HEADER.size:
+        return None
+
+    length, = FRAME_HEADER.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise FrameTooLarge(f'Received a frame of {length} bytes, the maximum is {MAX_FRAME_SIZE}')
+
+    message = f.read(length)
+    if len(message) < length:
+        return None
 
     return message
 
 
+def get_messages(client_socket):
+    """
+    Generator that reads messages from a connection until the peer closes it
+
+    :param client_socket: Accepted connection
+    :return: Messages as bytes
+    """
+
+    with client_socket.makefile('rb') as f:
+        while True:
+            message = read_frame(f)
+            if message is None:
+                break
+
+            yield message
+
+    client_socket.close()
+
+
 def send_message(host, port, message: bytes):
-    s = connect(host, port)
-    s.send(message)
-    s.close()
+    connection_pool.send_message(host, port, write_frame(message))
+
+
+def close_connection(host, port):
+    connection_pool.close_connection(host, port)
 
 
 def is_alive(host, port):
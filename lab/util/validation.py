@@ -165,6 +165,71 @@ def assert_standard_scale(name: str, value: str) -> float:
     return scale
 
 
+def assert_message_codec(name: str, value: str) -> str:
+    if value in ["binary", "json"]:
+        return value
+    else:
+        raise AssertionError(
+            "Invalid message codec for {}: `{}`".format(name, value))
+
+
+def assert_server_mode(name: str, value: str) -> str:
+    if value in ["asyncio", "process"]:
+        return value
+    else:
+        raise AssertionError(
+            "Invalid server mode for {}: `{}`".format(name, value))
+
+
+def assert_compression(name: str, value: str) -> str:
+    if value in ["zlib", "none"]:
+        return value
+    else:
+        raise AssertionError(
+            "Invalid compression for {}: `{}`".format(name, value))
+
+
+def assert_edge_format(name: str, value: str) -> str:
+    if value in ["binary", "text"]:
+        return value
+    else:
+        raise AssertionError(
+            "Invalid edge format for {}: `{}`".format(name, value))
+
+
+def assert_partition_engine(name: str, value: str) -> str:
+    if value in ["stream", "numpy", "parallel"]:
+        return value
+    else:
+        raise AssertionError(
+            "Invalid partition engine for {}: `{}`".format(name, value))
+
+
+def assert_partition_strategy(name: str, value: str) -> str:
+    if value in ["ranges", "greedy"]:
+        return value
+    else:
+        raise AssertionError(
+            "Invalid partition strategy for {}: `{}`".format(name, value))
+
+
+def assert_socket_dir(name: str, value: str) -> str or None:
+    """
+    Makes sure the value is an existing directory or empty, otherwise raises AssertionError
+
+    :param name: Argument name
+    :param value: Value
+    :return: Value as string, None if empty
+    """
+    if value == '':
+        return None
+
+    if not os.path.isdir(value):
+        raise AssertionError("Invalid socket directory for {}: `{}`".format(name, value))
+
+    return value
+
+
 def assert_master_type(name: str, value: str):
     """
     Makes sure the value represents a Master class otherwise raises AssertionError
@@ -196,3 +261,20 @@ def no_assertion(name: str, value: str) -> str:
     :return: Value
     """
     return value
+
+
+def assert_cache_dir(name: str, value: str) -> str or None:
+    """
+    Makes sure the value is a directory path or empty, the directory is created when it does not exist
+
+    :param name: Argument name
+    :param value: Value
+    :return: Value as string, None if empty
+    """
+    if value == '':
+        return None
+
+    if os.path.exists(value) and not os.path.isdir(value):
+        raise AssertionError("Invalid cache directory for {}: `{}`".format(name, value))
+
+    return value